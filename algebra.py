@@ -0,0 +1,228 @@
+from itertools import product
+
+import core as FO
+from converters import free, unall, unimply
+from traversal import fold
+
+# A bottom-up query engine: a formula is translated into a relational-algebra
+# plan once, and running the plan computes all satisfying assignments of its
+# free variables in one pass over the structure.
+#
+# Each plan node has sorted "columns" (the free variables of its formula) and
+# evaluates to a set of row tuples in that column order:
+#
+#   Scan       a relation atom over variables and constants
+#   Filter     any other atom, checked for every assignment of its variables
+#   Join       ∧, as a hash join on the shared columns
+#   AntiJoin   φ ∧ ¬ψ where the columns of ψ are among those of φ
+#   Union      ∨, padding either side to the common columns
+#   Project    ∃, dropping a column
+#   Complement ¬, relative to the universe
+#
+# ∀, → and ↔ are rewritten to the other connectives first.
+#
+# Plans are built and run with explicit stacks rather than by recursion, so
+# that deep formulas do not exhaust the Python stack.
+class Query:
+    def __init__(self, formula):
+        self.formula = formula
+        self.plan = plan(formula)
+
+    # Return the answer relation as a tuple of column names and a set of rows.
+    def run(self, structure):
+        return self.plan.columns, execute(self.plan, structure)
+
+    def explain(self):
+        return '\n'.join(self.plan.explain())
+
+    def __str__(self):
+        return self.explain()
+
+connectives = (FO.Exists, FO.Negation, FO.And, FO.Or)
+
+def plan(x):
+    plans = {}
+    def leave(x, children):
+        if children is None:
+            p = atom(x) if isinstance(x, FO.Formula) else None
+        elif x.__class__ is FO.Exists:
+            p = Project(children[1], x.variable.name)
+        elif x.__class__ is FO.Negation:
+            if x.formula.__class__ is FO.Negation:
+                p = plans[x.formula.formula]
+            else:
+                p = Complement(children[0])
+        elif x.__class__ is FO.Or:
+            p = Union(*children)
+        else:
+            # A negated conjunct whose variables are all bound by the other
+            # conjunct only removes rows, so it need not be complemented.
+            p = Join(*children)
+            for f1, f2 in ((x.formula1, x.formula2), (x.formula2, x.formula1)):
+                if f2.__class__ is FO.Negation and free(f2) <= free(f1):
+                    p = AntiJoin(plans[f1], plans[f2.formula])
+                    break
+        plans[x] = p
+        return p
+    return fold(unall(unimply(x)), leave, lambda x: x.__class__ in connectives)
+
+def atom(x):
+    if x.__class__ is FO.Relation and all(t.__class__ in (FO.Variable, FO.Constant) for t in x.terms):
+        return Scan(x)
+    return Filter(x)
+
+# Run a plan bottom-up: each node computes its rows from those of its
+# children, which are collected on out and dropped once they are used.
+def execute(plan, structure):
+    out, stack = [], [(plan, False)]
+    while stack:
+        node, done = stack.pop()
+        if not done:
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(node.children))
+            continue
+        n = len(node.children)
+        inputs = out[len(out)-n:]
+        del out[len(out)-n:]
+        out.append(node.run(structure, inputs))
+    return out[0]
+
+class Node:
+    def __init__(self, columns, *children):
+        self.columns = tuple(sorted(columns))
+        self.children = children
+
+    # One line per node of the plan below this one, indented by depth.
+    def explain(self):
+        lines, stack = [], [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            lines.append('  ' * depth + '{0} → ({1})'.format(node.label(), ', '.join(node.columns)))
+            stack.extend((c, depth + 1) for c in reversed(node.children))
+        return lines
+
+    def label(self):
+        return self.__class__.__name__
+
+class Scan(Node):
+    def __init__(self, atom):
+        Node.__init__(self, free(atom))
+        self.atom = atom
+
+    def label(self):
+        return 'Scan {0}'.format(self.atom)
+
+    def run(self, structure, inputs):
+        # Each argument position either fixes a constant, or reads a column;
+        # repeated variables must agree.
+        constants = [(i, structure.constants[t.constant]) for i, t in enumerate(self.atom.terms) if t.__class__ is FO.Constant]
+        positions = {}
+        for i, t in enumerate(self.atom.terms):
+            if t.__class__ is FO.Variable:
+                positions.setdefault(t.name, []).append(i)
+        read = [positions[c][0] for c in self.columns]
+        same = [(p[0], i) for p in positions.values() for i in p[1:]]
+        return {
+            tuple(t[i] for i in read)
+            for t in structure.relations[self.atom.symbol]
+            if all(t[i] == c for i, c in constants) and all(t[i] == t[j] for i, j in same)
+        }
+
+class Filter(Node):
+    def __init__(self, formula):
+        Node.__init__(self, free(formula))
+        self.formula = formula
+
+    def label(self):
+        return 'Filter {0}'.format(self.formula)
+
+    def run(self, structure, inputs):
+        return {
+            row for row in product(structure.universe, repeat=len(self.columns))
+            if self.formula.evaluate(structure, FO.Allocation(dict(zip(self.columns, row))))
+        }
+
+class Join(Node):
+    def __init__(self, left, right):
+        Node.__init__(self, set(left.columns) | set(right.columns), left, right)
+        self.keys = tuple(sorted(set(left.columns) & set(right.columns)))
+
+    def label(self):
+        return 'Join on ({0})'.format(', '.join(self.keys))
+
+    def run(self, structure, inputs):
+        left, right = self.children
+        # Build the hash table on the smaller input.
+        rows1, rows2 = inputs
+        if len(rows1) > len(rows2):
+            (left, rows1), (right, rows2) = (right, rows2), (left, rows1)
+        table = {}
+        key1 = [left.columns.index(k) for k in self.keys]
+        for row in rows1:
+            table.setdefault(tuple(row[i] for i in key1), []).append(row)
+        key2 = [right.columns.index(k) for k in self.keys]
+        out = [(0, left.columns.index(c)) if c in left.columns else (1, right.columns.index(c)) for c in self.columns]
+        return {
+            tuple((row1, row2)[side][i] for side, i in out)
+            for row2 in rows2
+            for row1 in table.get(tuple(row2[i] for i in key2), ())
+        }
+
+class AntiJoin(Node):
+    def __init__(self, left, right):
+        Node.__init__(self, left.columns, left, right)
+
+    def label(self):
+        return 'AntiJoin on ({0})'.format(', '.join(self.children[1].columns))
+
+    def run(self, structure, inputs):
+        left, right = self.children
+        rows, exclude = inputs
+        key = [left.columns.index(c) for c in right.columns]
+        return {row for row in rows if tuple(row[i] for i in key) not in exclude}
+
+class Union(Node):
+    def __init__(self, left, right):
+        Node.__init__(self, set(left.columns) | set(right.columns), left, right)
+
+    def run(self, structure, inputs):
+        return set().union(*(pad(child, rows, self.columns, structure) for child, rows in zip(self.children, inputs)))
+
+class Project(Node):
+    def __init__(self, child, name):
+        Node.__init__(self, set(child.columns) - {name}, child)
+        self.name = name
+
+    def label(self):
+        return 'Project ∃{0}'.format(self.name)
+
+    def run(self, structure, inputs):
+        child, = self.children
+        rows, = inputs
+        if self.name not in child.columns:
+            # The variable does not occur; ∃ only fails on an empty universe.
+            return rows if structure.universe else set()
+        keep = [child.columns.index(c) for c in self.columns]
+        return {tuple(row[i] for i in keep) for row in rows}
+
+class Complement(Node):
+    def __init__(self, child):
+        Node.__init__(self, child.columns, child)
+
+    def run(self, structure, inputs):
+        rows, = inputs
+        return {row for row in product(structure.universe, repeat=len(self.columns)) if row not in rows}
+
+# Extend the rows of a node to a superset of its columns, with every
+# element of the universe in each missing column.
+def pad(node, rows, columns, structure):
+    if node.columns == columns:
+        return rows
+    missing = [c for c in columns if c not in node.columns]
+    out = set()
+    for row in rows:
+        values = dict(zip(node.columns, row))
+        for extra in product(structure.universe, repeat=len(missing)):
+            values.update(zip(missing, extra))
+            out.add(tuple(values[c] for c in columns))
+    return out
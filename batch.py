@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import core as FO
+
+# Check the same formulas against many structures in a pool of worker
+# processes.
+#
+# The formulas are sent to each worker once, when it starts, and the
+# structures are sent in chunks of the given size. At most backlog chunks
+# per worker are in flight at a time, so the structures may come from a
+# long or lazy iterable. For each structure in turn, the generator yields
+# the list of truth values of the formulas, evaluated without free variables.
+#
+# With workers=1, everything is evaluated in this process instead. The
+# arguments are checked on the call, before the first result is asked for.
+def check(structures, formulas, workers=None, chunksize=16, backlog=2):
+    if chunksize < 1 or backlog < 1:
+        raise ValueError("chunksize and backlog must be positive, not %r and %r." % (chunksize, backlog))
+    return _results(structures, list(formulas), workers, chunksize, backlog)
+
+def _results(structures, formulas, workers, chunksize, backlog):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for structure in structures:
+            yield evaluate(formulas, structure)
+        return
+
+    structures = iter(structures)
+    chunks = iter(lambda: list(islice(structures, chunksize)), [])
+    pool = ProcessPoolExecutor(workers, initializer=_setup, initargs=(formulas,))
+    try:
+        pending = deque(pool.submit(_check, chunk) for chunk in islice(chunks, workers * backlog))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(_check, chunk))
+            yield from results
+    finally:
+        # A generator that is closed early leaves no work behind.
+        pool.shutdown(cancel_futures=True)
+
+def evaluate(formulas, structure):
+    return [f.evaluate(structure, FO.Allocation({})) for f in formulas]
+
+# The formulas of the worker process, set by its initializer.
+_formulas = None
+
+def _setup(formulas):
+    global _formulas
+    _formulas = formulas
+
+def _check(chunk):
+    return [evaluate(_formulas, structure) for structure in chunk]
+
+
+# Evaluate a single formula on a large structure by splitting the domain of
+# its outermost quantifier, or of its outer depth quantifiers if they are of
+# the same kind, across a pool of worker processes.
+#
+# Where possible the workers are forked, so that they share the structure
+# with this process instead of receiving a copy; only the values of the
+# split variables are sent to them. The assignments of the split variables
+# are enumerated lazily and sent in chunks of the given size, with at most
+# backlog chunks per worker in flight, as in check(). As soon as one worker
+# finds a counterexample to ∀ or a witness for ∃, the others are told to stop.
+#
+# A worker checks for that between two assignments, and cannot interrupt the
+# evaluation of the body for one assignment; a worker that is busy with a
+# long one only stops once it is done with it. split() returns the answer
+# without waiting for such workers.
+def split(formula, structure, allocation=None, workers=None, depth=1, chunksize=16, backlog=2):
+    if chunksize < 1 or backlog < 1:
+        raise ValueError("chunksize and backlog must be positive, not %r and %r." % (chunksize, backlog))
+    if allocation is None:
+        allocation = {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    prefix = []
+    body = formula
+    while body.__class__ in (FO.Exists, FO.Forall) and len(prefix) < depth:
+        if prefix and body.__class__ is not formula.__class__:
+            break
+        prefix.append(body)
+        body = body.formula
+    if not prefix or workers == 1:
+        return formula.evaluate(structure, FO.Allocation(allocation))
+
+    # A worker returns the decisive value (True for ∃, False for ∀) if it
+    # finds it, and the other one otherwise.
+    decisive = formula.__class__ is FO.Exists
+    values = _assignments(prefix, structure, FO.Allocation(allocation))
+    chunks = iter(lambda: list(islice(values, chunksize)), [])
+    names = [q.variable.name for q in prefix]
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    stop = context.Event()
+    pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_setup_split,
+                               initargs=(body, structure, allocation, names, decisive, stop))
+    try:
+        pending = {pool.submit(_split, chunk) for chunk in islice(chunks, workers * backlog)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if any(future.result() == decisive for future in done):
+                stop.set()
+                return decisive
+            pending.update(pool.submit(_split, chunk) for chunk in islice(chunks, len(done)))
+        return not decisive
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# Enumerate the values of the variables of the quantifiers in prefix.
+def _assignments(prefix, structure, allocation):
+    if not prefix:
+        yield ()
+        return
+    q = prefix[0]
+    allocation.names.append(q.variable.name)
+    allocation.values.append(None)
+    try:
+        for element in q.domain(structure, allocation):
+            allocation.values[-1] = element
+            for rest in _assignments(prefix[1:], structure, allocation):
+                yield (element,) + rest
+    finally:
+        allocation.names.pop()
+        allocation.values.pop()
+
+# The formula body, structure and so on of the worker process.
+_task = None
+
+def _setup_split(*task):
+    global _task
+    _task = task
+
+def _split(values):
+    body, structure, allocation, names, decisive, stop = _task
+    allocation = FO.Allocation(allocation)
+    allocation.names.extend(names)
+    for v in values:
+        if stop.is_set():
+            break
+        allocation.values[:] = v
+        if body.evaluate(structure, allocation) == decisive:
+            return decisive
+    return not decisive
@@ -0,0 +1,29 @@
+# Time batch.check on many random graphs with different numbers of workers.
+#
+#     python -m bench.batch [structures] [size] [workers ...]
+
+import os
+import sys
+import time
+
+import batch
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature
+from bench.index import formulas, graph
+
+def main(count=2000, n=30, *workers):
+    L, P = lexer(signature), FoParser(signature)
+    fs = [P.parse(L.lex(text)).fo() for text in formulas.values()]
+    structures = [graph(n, 3, seed) for seed in range(count)]
+    expected = None
+    for w in workers or sorted({1, 2, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        results = list(batch.check(structures, fs, workers=w))
+        t = time.perf_counter() - start
+        assert expected is None or results == expected
+        expected = results
+        print('{0:3} workers  {1} structures  {2:.3f}s  {3:.0f} structures/s'.format(w, count, t, count / t))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,38 @@
+# Time converters.to_clauses on formulas of n nested quantifiers, and count
+# the literals and the atom arguments of the clause set; all of them should
+# grow linearly with n.
+#
+#     python -m bench.clauses [size ...]
+
+import sys
+import timeit
+
+import core as FO
+import converters
+
+# ∀x1 (P(x1) ∨ ∃y1 (E(x1, y1) ∧ ∀x2 (P(x2) ∨ ∃y2 (E(x2, y2) ∧ ...)))), so
+# that every level has a conjunction below a disjunction, which needs a
+# definitional atom.
+def formula(n):
+    x = FO.Relation('P', (FO.Variable('x%d' % n),))
+    for i in range(n, 0, -1):
+        v, w = FO.Variable('x%d' % i), FO.Variable('y%d' % i)
+        x = FO.Forall(v, FO.Or(FO.Relation('P', (v,)), FO.Exists(w, FO.And(FO.Relation('E', (v, w)), x))))
+    return x
+
+def size(clauses, table):
+    literals = sum(map(len, clauses))
+    arguments = sum(len(atom.terms) for atom in table if atom.__class__ is FO.Relation)
+    return literals, arguments
+
+def main(*sizes):
+    sizes = sizes or (1000, 2000, 4000, 8000)
+    for n in sizes:
+        x = formula(n)
+        t = min(timeit.repeat(lambda: converters.to_clauses(x), number=1, repeat=3))
+        literals, arguments = size(*converters.to_clauses(x))
+        print('{0:6} quantifiers  {1:.3f}s  {2:.1f}us/quantifier  {3} literals  {4} atom arguments'.format(
+            n, t, t / n * 1e6, literals, arguments))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+# Compare lr1.parse with the standalone module from lr1.generate() on the
+# FO grammar: import time of the generated module against building or
+# loading the tables, and parse time. Neither the import nor the parse is
+# reliably faster than with the tables; a speedup below 1 is a slowdown.
+#
+#     python -m bench.codegen [depth]
+
+import importlib
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature, formulas
+
+def main(depth=1000):
+    L = lexer(signature)
+    start = time.perf_counter()
+    P = FoParser(signature, cache=False)
+    build = time.perf_counter() - start
+    FoParser(signature, cache=True)
+    start = time.perf_counter()
+    FoParser(signature, cache=True)
+    cached = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'fo_parser_generated.py'), 'w') as f:
+            f.write(P.generate())
+        sys.path.insert(0, directory)
+        try:
+            start = time.perf_counter()
+            generated = importlib.import_module('fo_parser_generated')
+            imported = time.perf_counter() - start
+        finally:
+            sys.path.remove(directory)
+    print('startup  build: {0:.4f}s  cache: {1:.4f}s  import generated: {2:.4f}s'.format(build, cached, imported))
+
+    inputs = {
+        'axioms': [L.lex(text) for text in formulas.values()],
+        'nested': [L.lex('(' * depth + 'E(x,y)' + ' ∧ E(y,x))' * depth)],
+    }
+    for name, tokens in inputs.items():
+        count = sum(len(t) for t in tokens)
+        number = max(1, 20000 // count)
+        tables = min(timeit.repeat(lambda: [P.parse(t) for t in tokens], number=number, repeat=3)) / number
+        code = min(timeit.repeat(lambda: [generated.parse(t) for t in tokens], number=number, repeat=3)) / number
+        print('{0:8} {1:6} tokens  lr1.parse: {2:.0f} tokens/s  generated: {3:.0f} tokens/s  speedup: {4:.2f}x'.format(
+            name, count, count / tables, count / code, tables / code))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
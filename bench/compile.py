@@ -0,0 +1,51 @@
+# Compare Formula.evaluate against compiler.compile on the graph axioms of main.py.
+#
+#     python -m bench.compile [size]
+
+import sys
+import timeit
+
+import core as FO
+from compiler import compile
+from cfg_fo import FoParser
+from lexer_fo import lexer, Relation
+
+class E(Relation):
+    pass
+
+class Leq(Relation):
+    pass
+
+signature = {
+    'relations': {'E': (E, 2), 'L': (Leq, 2)},
+    'functions': {},
+    'constants': {},
+}
+sig = {'E': ('relation', 2), 'L': ('relation', 2)}
+
+formulas = {
+    'equivalence': '((∀x E(x,x) ∧ ∀x∀y(E(x,y) ↔ E(y,x))) ∧ ∀x∀y∀z((E(x,y) ∧ E(y,z)) → E(x,z)))',
+    'order': '(((∀x L(x,x) ∧ ∀x∀y((L(x,y) ∧ L(y,x)) → x=y)) ∧ ∀x∀y∀z((L(x,y) ∧ L(y,z)) → L(x,z))) ∧ ∀x∀y(L(x,y) ∨ L(y,x)))',
+}
+
+def structure(n):
+    universe = list(range(n))
+    # An equivalence relation with classes of size 4 and a linear order, so that
+    # both formulas hold and every quantifier runs to completion.
+    E = {(x, y) for x in universe for y in universe if x // 4 == y // 4}
+    L = {(x, y) for x in universe for y in universe if x <= y}
+    return FO.Structure(universe, {'E': E, 'L': L}, {}, {})
+
+def main(n=40):
+    L, P = lexer(signature), FoParser(signature)
+    s = structure(n)
+    for name, text in formulas.items():
+        formula = P.parse(L.lex(text), actions=True)
+        f = compile(formula, sig)
+        assert f(s) == formula.evaluate(s, FO.Allocation({}))
+        slow = min(timeit.repeat(lambda: formula.evaluate(s, FO.Allocation({})), number=1, repeat=3))
+        fast = min(timeit.repeat(lambda: f(s), number=1, repeat=3))
+        print('{0:12} |U|={1}  evaluate: {2:.3f}s  compiled: {3:.3f}s  speedup: {4:.1f}x'.format(name, n, slow, fast, slow / fast))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,113 @@
+# Seeded random formulas and structures for the benchmarks.
+#
+# A signature maps each symbol to ('relation', arity), ('function', arity) or
+# 'constant', as in converters.signature. All generators take a random.Random
+# instance, so that the same seed always gives the same input.
+
+import core as FO
+
+# The relative frequency of each connective, and of the two kinds of atoms.
+default_mix = {
+    FO.And: 4, FO.Or: 3, FO.Implies: 2, FO.Equivalent: 1,
+    FO.Negation: 2, FO.Exists: 2, FO.Forall: 2,
+    FO.Relation: 6, FO.Equals: 1,
+}
+
+binary = (FO.And, FO.Or, FO.Implies, FO.Equivalent)
+unary = (FO.Negation, FO.Exists, FO.Forall)
+
+# A random closed formula with size atoms and at most depth nested
+# quantifiers, whose connectives follow the weights in mix. Variables are
+# named x1 ... x<variables>; terms contain at most term_depth nested function
+# symbols. Variables that are left free are bound by ∀ at the front.
+def formula(rng, signature, size=20, depth=3, mix=None, variables=3, term_depth=1):
+    mix = {**default_mix, **(mix or {})}
+    relations = [(s, kind[1]) for s, kind in signature.items() if kind != 'constant' and kind[0] == 'relation']
+    if not relations:
+        mix[FO.Relation] = 0
+    names = ['x%d' % (i + 1) for i in range(variables)]
+
+    def term(scope, level):
+        symbols = [(s, kind) for s, kind in signature.items() if kind == 'constant' or kind[0] == 'function']
+        if level < term_depth and symbols and rng.random() < 0.3:
+            s, kind = rng.choice(symbols)
+            if kind == 'constant':
+                return FO.Constant(s)
+            return FO.Function(s, [term(scope, level + 1) for _ in range(kind[1])])
+        return FO.Variable(rng.choice(scope or names))
+
+    def atom(scope):
+        if pick({FO.Relation: mix[FO.Relation], FO.Equals: mix[FO.Equals]}) is FO.Equals:
+            return FO.Equals(term(scope, 0), term(scope, 0))
+        s, arity = rng.choice(relations)
+        return FO.Relation(s, [term(scope, 0) for _ in range(arity)])
+
+    def pick(weights):
+        choices = [c for c, w in weights.items() if w > 0]
+        return rng.choices(choices, [weights[c] for c in choices])[0]
+
+    def build(size, scope, level):
+        weights = {c: mix[c] for c in unary if c is FO.Negation or level < depth}
+        if size > 1:
+            weights.update((c, mix[c]) for c in binary)
+        else:
+            weights['atom'] = mix[FO.Relation] + mix[FO.Equals]
+        c = pick(weights)
+        if c == 'atom':
+            return atom(scope)
+        elif c is FO.Negation:
+            return FO.Negation(build(size, scope, level))
+        elif c in unary:
+            name = rng.choice([n for n in names if n not in scope] or names)
+            return c(FO.Variable(name), build(size, scope + [name], level + 1))
+        k = rng.randint(1, size - 1)
+        return c(build(k, scope, level), build(size - k, scope, level))
+
+    x = build(size, [], 0)
+    for name in sorted(x.free_vars, reverse=True):
+        x = FO.Forall(FO.Variable(name), x)
+    return x
+
+# A function of a structure, given by its table of values.
+class Table:
+    def __init__(self, values):
+        self.values = values
+
+    def evaluate(self, arguments):
+        return self.values[arguments]
+
+# A random structure on n elements: each tuple is in each relation with the
+# given probability, and functions and constants take random values.
+def structure(rng, signature, n, density=0.3):
+    universe = list(range(n))
+    relations, functions, constants = {}, {}, {}
+    for s, kind in sorted(signature.items()):
+        if kind == 'constant':
+            constants[s] = rng.choice(universe)
+        elif kind[0] == 'relation':
+            relations[s] = {t for t in tuples(universe, kind[1]) if rng.random() < density}
+        else:
+            functions[s] = Table({t: rng.choice(universe) for t in tuples(universe, kind[1])})
+    return FO.Structure(universe, relations, functions, constants)
+
+# A random directed graph: each edge exists with probability p.
+def graph(rng, n, p=0.3, symbol='E'):
+    return structure(rng, {symbol: ('relation', 2)}, n, p)
+
+# A random linear order, given as ≤ on a shuffled universe.
+def order(rng, n, symbol='L'):
+    universe = list(range(n))
+    ranks = list(universe)
+    rng.shuffle(ranks)
+    relation = {(x, y) for x in universe for y in universe if ranks[x] <= ranks[y]}
+    return FO.Structure(universe, {symbol: relation}, {}, {})
+
+# A random unary function f, with constant c.
+def function(rng, n, symbol='f', constant='c'):
+    return structure(rng, {symbol: ('function', 1), constant: 'constant'}, n)
+
+def tuples(universe, arity):
+    result = [()]
+    for _ in range(arity):
+        result = [t + (x,) for t in result for x in universe]
+    return result
@@ -0,0 +1,49 @@
+# Time guarded quantifiers on a sparse random graph, with and without the
+# relation indexes of core.Structure.
+#
+#     python -m bench.index [size] [degree]
+
+import random
+import sys
+import timeit
+
+import core as FO
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature
+
+formulas = {
+    'neighbour': '∀x∃y(E(x,y) ∧ ¬x=y)',
+    'symmetric': '∀x∀y(E(x,y) → E(y,x))',
+    'transitive': '∀x∀y∀z((E(x,y) ∧ E(y,z)) → E(x,z))',
+}
+
+def graph(n, degree, seed=0):
+    rng = random.Random(seed)
+    universe = list(range(n))
+    E = set()
+    for x in universe:
+        for y in rng.sample(universe, degree):
+            E.update({(x, y), (y, x)})
+    return FO.Structure(universe, {'E': E}, {}, {})
+
+def main(n=300, degree=3):
+    L, P = lexer(signature), FoParser(signature)
+    s = graph(n, degree)
+    for name, text in formulas.items():
+        formula = P.parse(L.lex(text)).fo()
+        indexed = lambda: formula.evaluate(s, FO.Allocation({}))
+        fast = min(timeit.repeat(indexed, number=1, repeat=3))
+        # Disable the guards by evaluating against the full universe.
+        domains = FO.Exists.domain, FO.Forall.domain
+        FO.Exists.domain = FO.Forall.domain = lambda self, structure, allocation: structure.universe
+        try:
+            result = formula.evaluate(s, FO.Allocation({}))
+            slow = min(timeit.repeat(lambda: formula.evaluate(s, FO.Allocation({})), number=1, repeat=1))
+        finally:
+            FO.Exists.domain, FO.Forall.domain = domains
+        assert result == indexed()
+        print('{0:12} |U|={1} degree≈{2}  scan: {3:.3f}s  indexed: {4:.3f}s  speedup: {5:.1f}x'.format(name, n, 2 * degree, slow, fast, slow / fast))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
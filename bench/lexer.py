@@ -0,0 +1,32 @@
+# Lexer throughput on the FO signature: with the literal characters given as
+# a char_class (checked by the master expression) or as a char_filter
+# (checked one by one), and lazily from a file object with tokens().
+#
+#     python -m bench.lexer [copies]
+
+import io
+import sys
+import timeit
+
+import parser.lexer
+import lexer_fo
+from bench.compile import signature, formulas
+
+def main(copies=2000):
+    text = ' '.join(list(formulas.values()) * copies)
+    fast = lexer_fo.lexer(signature)
+    slow = parser.lexer.lexer(fast.meta, fast.names, fast.variable,
+                              char_filter=lambda c: '1' <= c <= '9' or 'a' <= c <= 'z' or 'A' <= c <= 'Z')
+    count = len(fast.lex(text))
+    runs = {
+        'char_class': lambda: fast.lex(text),
+        'char_filter': lambda: slow.lex(text),
+        'file': lambda: sum(1 for _ in fast.tokens(io.StringIO(text))),
+    }
+    print('{0} characters, {1} tokens'.format(len(text), count))
+    for name, run in runs.items():
+        t = min(timeit.repeat(run, number=1, repeat=3))
+        print('{0:12} {1:.3f}s  {2:.0f} tokens/s'.format(name, t, count / t))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,29 @@
+# Compare the SLR(1), LALR(1) and canonical LR(1) constructions of parser.cfg
+# on the grammar of cfg_fo.prods: build time, the size of the tables, and
+# the memory taken by the shift/reduce dicts and the dense action/goto arrays.
+#
+#     python -m bench.lr [symbols ...]
+
+import sys
+import timeit
+
+import cfg_fo
+from parser import cfg
+from bench.compile import signature
+from bench.slr import signature as generated
+
+constructions = [(cfg.slr1_grammar, 'slr1'), (cfg.lalr1_grammar, 'lalr1'), (cfg.lr1_grammar, 'lr1')]
+
+def main(*sizes):
+    signatures = [('graph', signature)] + [('%d symbols' % n, generated(n)) for n in sizes or (10, 50)]
+    for name, s in signatures:
+        for grammar, construction in constructions:
+            g = grammar(cfg_fo.prods(**s), cfg_fo.Formula)
+            t = min(timeit.repeat(getattr(g, construction), number=1, repeat=3))
+            automaton = getattr(g, construction)()
+            print('{0:12} {1:6} {2:5} states  {3:7} shifts  {4:5} reductions  {5:.3f}s  {6}'.format(
+                name, construction, len(automaton.states), len(automaton.shift), len(automaton.reduce), t,
+                '  '.join('{0}: {1}kB'.format(table, size // 1024) for table, size in automaton.memory().items())))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
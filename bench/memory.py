@@ -0,0 +1,73 @@
+# Memory of lexed and parsed formulas: tokens as a list of Term objects per
+# formula, with a __dict__ per object (as before the symbol classes had
+# __slots__) or with __slots__, and all tokens in one lexer.token_array; and
+# parse trees of NonTerm objects with a __dict__ or with __slots__.
+#
+#     python -m bench.memory [formulas]
+
+import sys
+import time
+import tracemalloc
+
+from parser import symbol
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature, formulas
+
+# A subclass of each symbol class, which has a __dict__ again.
+plain = {}
+def unslotted(cls):
+    if cls not in plain:
+        plain[cls] = type(cls.__name__, (cls,), {})
+    return plain[cls]
+
+def unslotted_tree(x):
+    if not isinstance(x, symbol.NonTerm):
+        return unslotted(type(x))(x.value)
+    return unslotted(type(x))([unslotted_tree(y) for y in x.production])
+
+# The memory allocated by f() for its result, and the time it takes.
+def measure(f):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = f()
+        elapsed = time.perf_counter() - start
+        return tracemalloc.get_traced_memory()[0], elapsed, result
+    finally:
+        tracemalloc.stop()
+
+def main(count=100000):
+    L, P = lexer(signature), FoParser(signature)
+    texts = list(formulas.values()) * (count // len(formulas))
+    dict_lexer = lexer(signature)
+    dict_lexer.meta = {c: unslotted(cls) for c, cls in L.meta.items()}
+    dict_lexer.names = {name: unslotted(cls) for name, cls in L.names.items()}
+    dict_lexer.variable = unslotted(L.variable)
+
+    runs = [
+        ('tokens, __dict__', lambda: [dict_lexer.lex(text) for text in texts]),
+        ('tokens, __slots__', lambda: [L.lex(text) for text in texts]),
+        ('token_array', lambda: L.compact(text + '\n' for text in texts)),
+    ]
+    tokens = None
+    for name, run in runs:
+        memory, elapsed, result = measure(run)
+        tokens = tokens or sum(map(len, result))
+        print('{0:20} {1:8.1f} MiB  {2:5.1f} bytes/token  {3:.2f}s'.format(name, memory / 2**20, memory / tokens, elapsed))
+        del result
+    print('{0} formulas, {1} tokens'.format(len(texts), tokens))
+
+    # Parse trees take more room, and are measured on a tenth of the formulas.
+    lexed = [L.lex(text) for text in texts[:len(texts) // 10]]
+    runs = [
+        ('trees, __dict__', lambda: [unslotted_tree(P.parse(t)) for t in lexed]),
+        ('trees, __slots__', lambda: [P.parse(t) for t in lexed]),
+    ]
+    for name, run in runs:
+        memory, elapsed, result = measure(run)
+        print('{0:20} {1:8.1f} MiB  {2:5.1f} bytes/formula'.format(name, memory / 2**20, memory / len(lexed)))
+        del result
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,68 @@
+# Time the variable sets of all subformulas, cached on the nodes and with the
+# recursive recomputation that free() and var() used to do: quadratic when
+# recomputed, linear when cached. Then time converters.prenex with each
+# quantifier ordering, whose time per quantifier should stay constant, and
+# count the quantifier alternations in the resulting prefix.
+#
+#     python -m bench.prenex [size ...]
+
+import sys
+import timeit
+
+import core as FO
+import converters
+
+# The former recursive implementations, for comparison.
+def free(x):
+    if x.__class__ in (FO.Exists, FO.Forall):
+        return free(x.formula).difference({x.variable.name})
+    elif x.__class__ in (FO.Variable, FO.Bound, FO.Constant):
+        return {x.name} if x.__class__ is FO.Variable else set()
+    return set().union(*(free(y) for y in x.children()))
+
+def var(x):
+    if x.__class__ in (FO.Variable, FO.Bound):
+        return {x.name}
+    return set().union(*(var(y) for y in x.children()))
+
+# A balanced junction of n formulas ∃x_i ∀y E(x_i, y) that all share the
+# free variable y, so that every quantifier that is pulled out needs a
+# check for variable conflicts.
+def formula(n):
+    y = FO.Variable('y')
+    parts = [FO.Exists(FO.Variable('x%d' % i), FO.Relation('E', (FO.Variable('x%d' % i), y))) for i in range(n)]
+    parts = [FO.Forall(y, p) if i % 2 else FO.And(p, FO.Relation('E', (y, y))) for i, p in enumerate(parts)]
+    while len(parts) > 1:
+        parts = [FO.And(parts[i], parts[i+1]) if i + 1 < len(parts) else parts[i] for i in range(0, len(parts), 2)]
+    return parts[0]
+
+def subformulas(x):
+    stack = [x]
+    while stack:
+        x = stack.pop()
+        yield x
+        stack.extend(x.children())
+
+def main(*sizes):
+    sizes = sizes or (100, 1000, 5000)
+    for n in sizes:
+        x = formula(n)
+        nodes = list(subformulas(x))
+        slow = min(timeit.repeat(lambda: [(free(y), var(y)) for y in nodes], number=1, repeat=3))
+        fast = min(timeit.repeat(lambda: [(converters.free(y), converters.var(y)) for y in nodes], number=1, repeat=3))
+        print('{0:5} quantifiers  free/var of all subformulas  recursive: {1:.3f}s  cached: {2:.4f}s'.format(n, slow, fast))
+        for first in (None, FO.Exists, FO.Forall):
+            t = min(timeit.repeat(lambda: converters.prenex(x, first), number=1, repeat=3))
+            name = first.__name__ if first else 'formula order'
+            print('{0:5} quantifiers  prenex {1:13}  {2:.3f}s  {3:.1f}us/quantifier  {4} alternations'.format(
+                n, name, t, t / n * 1e6, alternations(converters.prenex(x, first))))
+
+def alternations(x):
+    prefix = []
+    while x.__class__ in (FO.Exists, FO.Forall):
+        prefix.append(x.__class__)
+        x = x.formula
+    return sum(a is not b for a, b in zip(prefix, prefix[1:]))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
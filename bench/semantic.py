@@ -0,0 +1,52 @@
+# Build core formulas from the parse tree with fo(), or directly in the
+# semantic actions of cfg_fo (parse with actions=True): objects created per
+# parse, peak memory and time.
+#
+#     python -m bench.semantic [copies]
+
+import sys
+import timeit
+import tracemalloc
+
+from parser import symbol
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature, formulas
+
+# The nodes of a parse tree, and those of them for unit productions without
+# an action, which parse(actions=True) skips.
+def count(tree):
+    nodes = units = 0
+    stack = [tree]
+    while stack:
+        x = stack.pop()
+        nodes += 1
+        units += len(x.production) == 1 and x.action is None
+        stack.extend(y for y in x.production if isinstance(y, symbol.NonTerm))
+    return nodes, units
+
+def peak(f):
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main(copies=200):
+    L, P = lexer(signature), FoParser(signature)
+    tokens = [L.lex(text) for text in formulas.values()] * copies
+    nodes, units = map(sum, zip(*(count(P.parse(t)) for t in tokens)))
+    print('{0} formulas: {1} parse tree nodes, {2} reductions with an action, {3} unit reductions skipped'.format(
+        len(tokens), nodes, nodes - units, units))
+    assert all(P.parse(t).fo() == P.parse(t, actions=True) for t in tokens)
+    runs = {
+        'tree + fo()': lambda: [P.parse(t).fo() for t in tokens],
+        'actions': lambda: [P.parse(t, actions=True) for t in tokens],
+    }
+    for name, run in runs.items():
+        t = min(timeit.repeat(run, number=1, repeat=5))
+        print('{0:12} {1:.3f}s  peak memory: {2} KiB'.format(name, t, peak(run) // 1024))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
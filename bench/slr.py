@@ -0,0 +1,31 @@
+# Time the SLR(1) table construction of parser.cfg on the grammar of
+# cfg_fo.prods for signatures with more and more symbols.
+#
+#     python -m bench.slr [symbols ...]
+
+import sys
+import timeit
+
+import cfg_fo
+import lexer_fo
+from parser import cfg
+
+# A signature with n relation, function and constant symbols each.
+def signature(n):
+    return {
+        'relations': {'R%d' % i: (type('R%d' % i, (lexer_fo.Relation,), {}), 1 + i % 3) for i in range(n)},
+        'functions': {'f%d' % i: (type('F%d' % i, (lexer_fo.Function,), {}), 1 + i % 2) for i in range(n)},
+        'constants': {'c%d' % i: type('C%d' % i, (lexer_fo.Constant,), {}) for i in range(n)},
+    }
+
+def main(*sizes):
+    for n in sizes or (10, 50, 100, 200):
+        grammar = cfg.slr1_grammar(cfg_fo.prods(**signature(n)), cfg_fo.Formula)
+        productions = sum(len(r) for r in grammar.prods.values())
+        t = min(timeit.repeat(grammar.slr1, number=1, repeat=3))
+        automaton = grammar.slr1()
+        print('{0:4} symbols  {1:5} productions  {2:5} states  {3:7} shifts  {4:5} reductions  {5:.3f}s'.format(
+            n, productions, len(automaton.states), len(automaton.shift), len(automaton.reduce), t))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
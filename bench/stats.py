@@ -0,0 +1,34 @@
+# Instrumented lexing and parsing of random formulas (see bench/generate.py):
+# the report of parser.stats, with the rules that are reduced most often, and
+# the cost of the instrumentation compared to parsing without it.
+#
+#     python -m bench.stats [formulas] [size] [seed]
+
+import random
+import sys
+import timeit
+
+import lexer_fo
+from cfg_fo import FoParser
+from parser.stats import statistics
+from bench import generate
+from bench.suite import signature, token_signature
+
+def main(count=1000, size=20, seed=1):
+    rng = random.Random(seed)
+    texts = [str(generate.formula(rng, signature, size)) for _ in range(count)]
+    tokens = token_signature(signature)
+    L, P = lexer_fo.lexer(tokens), FoParser(tokens, cache=False)
+
+    stats = statistics()
+    for text in texts:
+        P.parse(L.tokens(text, stats), actions=True, stats=stats)
+    print(stats.report())
+
+    lexed = [L.lex(text) for text in texts]
+    off = min(timeit.repeat(lambda: [P.parse(t, actions=True) for t in lexed], number=1, repeat=3))
+    on = min(timeit.repeat(lambda: [P.parse(t, actions=True, stats=statistics()) for t in lexed], number=1, repeat=3))
+    print('Parse without stats: {0:.3f}s, with stats: {1:.3f}s'.format(off, on))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,130 @@
+# Time the lexers, parsers, converters and evaluation on seeded random
+# formulas and structures (see bench/generate.py), and print the results as
+# JSON, so that runs on different versions can be compared.
+#
+#     python -m bench.suite [seed] [formulas] [size] [depth] [universe] > results.json
+#
+# Each result gives the best and mean time of a few repetitions for the whole
+# batch of formulas, and the best time per formula; a step that fails gives
+# its error instead.
+
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+import core as FO
+import converters
+import lexer_fo
+import profiler
+from cfg_fo import FoParser
+from bench import generate
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+signature = {'E': ('relation', 2), 'P': ('relation', 1), 'f': ('function', 1), 'c': 'constant'}
+
+# The module parser.py, which the package parser/ hides from import.
+def legacy():
+    spec = importlib.util.spec_from_file_location('legacy_parser', os.path.join(root, 'parser.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# The signature in the form of lexer_fo and cfg_fo, with a token class per symbol.
+def token_signature(signature):
+    result = {'relations': {}, 'functions': {}, 'constants': {}}
+    for s, kind in sorted(signature.items()):
+        if kind == 'constant':
+            result['constants'][s] = type(s, (lexer_fo.Constant,), {'__slots__': ()})
+        elif kind[0] == 'relation':
+            result['relations'][s] = (type(s, (lexer_fo.Relation,), {'__slots__': ()}), kind[1])
+        else:
+            result['functions'][s] = (type(s, (lexer_fo.Function,), {'__slots__': ()}), kind[1])
+    return result
+
+def revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def measure(run, count, repeat):
+    try:
+        run()
+        times = timeit.repeat(run, number=1, repeat=repeat)
+    except Exception as e:
+        return {'error': '{0}: {1}'.format(type(e).__name__, e)}
+    return {'best': min(times), 'mean': sum(times) / len(times), 'per_item': min(times) / count}
+
+def main(seed=1, count=100, size=12, depth=3, universe=8, repeat=3):
+    rng = random.Random(seed)
+    formulas = [generate.formula(rng, signature, size, depth) for _ in range(count)]
+    # Further structures with formulas over their own signature.
+    structures = {
+        'graph': (generate.graph(rng, universe), {'E': ('relation', 2)}),
+        'order': (generate.order(rng, universe), {'L': ('relation', 2)}),
+        'function': (generate.function(rng, universe), {'f': ('function', 1), 'c': 'constant'}),
+    }
+    structures = {name: (s, [generate.formula(rng, sig, size, depth) for _ in range(count)])
+                  for name, (s, sig) in structures.items()}
+    random_structure = generate.structure(rng, signature, universe)
+    texts = [str(x) for x in formulas]
+    tokens = token_signature(signature)
+    L = lexer_fo.lexer(tokens)
+    P = FoParser(tokens, cache=False)
+    lexed = [L.lex(text) for text in texts]
+    old = legacy()
+    old_signature = {s: ('constant', 0) if kind == 'constant' else kind for s, kind in signature.items()}
+    resolved = [FO.resolve(x) for x in formulas]
+    c = FO.Constant('c')
+
+    runs = {
+        'lex/lexer_fo': lambda: [L.lex(text) for text in texts],
+        'lex/lexer_fo.compact': lambda: L.compact(text + '\n' for text in texts),
+        'lex/parser.py': lambda: [old.lex(text) for text in texts],
+        'parse/parser.py': lambda: [old.main(text, old_signature) for text in texts],
+        'parse/FoParser.tables': (lambda: FoParser(tokens, cache=False), 1),
+        'parse/FoParser': lambda: [P.parse(t) for t in lexed],
+        'parse/FoParser.fo': lambda: [P.parse(t).fo() for t in lexed],
+        'parse/FoParser.actions': lambda: [P.parse(t, actions=True) for t in lexed],
+        'lex+parse/FoParser.stream': lambda: list(P.stream(L.compact(text + '\n' for text in texts), actions=True)),
+        'convert/verify': lambda: [converters.signature(signature).verify(x) for x in formulas],
+        'convert/unimply': lambda: [converters.unimply(x) for x in formulas],
+        'convert/unequiv': lambda: [converters.unequiv(x) for x in formulas],
+        'convert/unall': lambda: [converters.unall(x) for x in formulas],
+        'convert/substitute': lambda: [converters.substitute('x1', c, x) for x in formulas],
+        'convert/nnf': lambda: [converters.nnf(x) for x in formulas],
+        'convert/rename_apart': lambda: [converters.rename_apart(x) for x in formulas],
+        'convert/prenex': lambda: [converters.prenex(x) for x in formulas],
+        'convert/prenex.exists': lambda: [converters.prenex(x, FO.Exists) for x in formulas],
+        'convert/prenex.forall': lambda: [converters.prenex(x, FO.Forall) for x in formulas],
+        'convert/to_clauses': lambda: [converters.to_clauses(x) for x in formulas],
+        'convert/resolve': lambda: [FO.resolve(x) for x in formulas],
+        'evaluate/random': lambda: [x.evaluate(random_structure, FO.Allocation({})) for x in formulas],
+        'evaluate/random.resolved': lambda: [x.evaluate(random_structure, FO.Allocation({})) for x in resolved],
+        'evaluate/random.profile': lambda: [profiler.profile(x, random_structure) for x in formulas],
+    }
+    for name, (s, fs) in structures.items():
+        runs['evaluate/' + name] = lambda s=s, fs=fs: [x.evaluate(s, FO.Allocation({})) for x in fs]
+
+    results = {}
+    for name, run in runs.items():
+        run, n = run if isinstance(run, tuple) else (run, count)
+        results[name] = measure(run, n, repeat)
+    return {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'parameters': {'seed': seed, 'formulas': count, 'size': size, 'depth': depth, 'universe': universe, 'repeat': repeat},
+        'tokens': sum(map(len, lexed)),
+        'results': results,
+    }
+
+if __name__ == '__main__':
+    json.dump(main(*map(int, sys.argv[1:])), sys.stdout, indent=2, ensure_ascii=False)
+    print()
@@ -0,0 +1,28 @@
+# Compare compiler.compile against the NumPy tensor backend on the graph axioms.
+#
+#     python -m bench.tensor [size]
+
+import sys
+import timeit
+
+from compiler import compile
+from tensor import TensorStructure
+from cfg_fo import FoParser
+from lexer_fo import lexer
+from bench.compile import signature, sig, formulas, structure
+
+def main(n=300):
+    L, P = lexer(signature), FoParser(signature)
+    s = structure(n)
+    for name, text in formulas.items():
+        formula = P.parse(L.lex(text)).fo()
+        f = compile(formula, sig)
+        # A fresh TensorStructure per run, so that encoding the relations is included.
+        t = lambda: TensorStructure(s).evaluate(formula)
+        assert t() == f(s)
+        slow = min(timeit.repeat(lambda: f(s), number=1, repeat=1))
+        fast = min(timeit.repeat(t, number=1, repeat=3))
+        print('{0:12} |U|={1}  compiled: {2:.3f}s  tensor: {3:.3f}s  speedup: {4:.1f}x'.format(name, n, slow, fast, slow / fast))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -5,51 +5,88 @@ import symbols as SYM
 from parser import symbol, cfg
 import lexer_fo as t
 
-def FoParser(signature):
-    return cfg.slr1_grammar(prods(**signature), Formula).slr1()
+# The tables are built for each signature. With cache=True, they are built
+# once and then loaded from the cache of parser.cfg, which is stored in
+# $PARSER_CACHE or in the user's cache directory.
+def FoParser(signature, cache=False):
+    grammar = cfg.slr1_grammar(prods(**signature), Formula)
+    return grammar.cached('slr1') if cache else grammar.slr1()
 
-class Formula(symbol.NonTerm):
-    def fo(self):
-        return self.production[0].fo()
+# Each nonterminal builds its core object in a semantic action, from the
+# values of its right side: the core objects of the nonterminals, and the
+# tokens themselves. P.parse(tokens, actions=True) runs them during the parse,
+# and the unit productions Formula → Junction etc. are skipped. fo() computes
+# the same object from a parse tree that was built without actions.
+class Node(symbol.NonTerm):
+    __slots__ = ()
 
-class Term(symbol.NonTerm):
     def fo(self):
-        return self.production[0].fo()
+        values = [x.fo() if isinstance(x, symbol.NonTerm) else x for x in self.production]
+        return self.action(values) if self.action else values[0]
+
+class Formula(Node):
+    __slots__ = ()
+
+class Term(Node):
+    __slots__ = ()
 
 class Junction(Formula):
+    __slots__ = ()
     ops = {SYM.AND: FO.And, SYM.OR: FO.Or, SYM.IMP: FO.Implies, SYM.EQ: FO.Equivalent}
 
-    def fo(self):
-        return self.ops[self.production[2].value](self.production[1].fo(), self.production[3].fo())
+    @classmethod
+    def action(cls, p):
+        return cls.ops[p[2].value](p[1], p[3])
 
 class Quantified(Formula):
+    __slots__ = ()
     qs = {SYM.EXISTS: FO.Exists, SYM.FORALL: FO.Forall}
-    def fo(self):
-        return self.qs[self.production[0].value](self.production[1].fo(), self.production[2].fo())
+
+    @classmethod
+    def action(cls, p):
+        return cls.qs[p[0].value](p[1], p[2])
 
 class Negation(Formula):
-    def fo(self):
-        return FO.Negation(self.production[1].fo())
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Negation(p[1])
 
 class Relation(Formula):
-    def fo(self):
-        return FO.Relation(self.production[0].value, tuple(x.fo() for x in self.production[2:-1:2]))
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Relation(p[0].value, tuple(p[2:-1:2]))
 
 class Function(Term):
-    def fo(self):
-        return FO.Function(self.production[0].value, tuple(x.fo() for x in self.production[2:-1:2]))
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Function(p[0].value, tuple(p[2:-1:2]))
 
 class Constant(Term):
-    def fo(self):
-        return FO.Function(self.production[0].value, tuple(x.fo() for x in self.production[2:-1:2]))
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Constant(p[0].value)
 
 class Equality(Formula):
-    def fo(self):
-        return FO.Equals(self.production[0].fo(), self.production[2].fo())
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Equals(p[0], p[2])
 
 class Variable(Term):
-    def fo(self):
-        return FO.Variable(self.production[0].value)
+    __slots__ = ()
+
+    @staticmethod
+    def action(p):
+        return FO.Variable(p[0].value)
 
 def prods(relations={}, functions={}, constants=[]):
     prods = {
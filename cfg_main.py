@@ -18,9 +18,9 @@ P = FoParser(signature)
 print('This parser will read the following string and convert it to NNF')
 formula = '∃x ¬(E(x, x) ∧ ¬x=x)'
 print(formula)
-print(nnf(P.parse(L.lex(formula)).fo()))
+print(nnf(P.parse(L.lex(formula), actions=True)))
 
 print('This parser will read the following string and convert it to PNF')
 formula='¬(∃x E(x, x) ∧ ∀x∀y(¬x=y → E(x,y)))'
 print(formula)
-print(prenex(P.parse(L.lex(formula)).fo()))
+print(prenex(P.parse(L.lex(formula), actions=True)))
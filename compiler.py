@@ -0,0 +1,113 @@
+import core as FO
+from converters import signature as Signature, free
+
+# Compile a formula into a nested closure once, so that it can be checked
+# against many structures and allocations without walking the syntax tree.
+#
+# Every variable is resolved to a fixed slot of a flat environment list:
+# the free variables of the formula occupy the first slots (sorted by name),
+# and each quantifier gets the slot one past the slots of its enclosing
+# quantifiers. Nested quantifiers simply overwrite their own slot, so the
+# environment is allocated once per call and never copied.
+#
+# The returned callable takes a structure and an optional dictionary
+# (or Allocation) assigning the free variables, and returns a bool.
+#
+# Both compiling and running the closures take one Python frame per level of
+# the formula, so formulas higher than MAX_HEIGHT are rejected; evaluate
+# them with Formula.evaluate() instead, which handles any height.
+MAX_HEIGHT = 500
+
+def compile(formula, signature):
+    if formula.height > MAX_HEIGHT:
+        raise ValueError("Formula of height %d is too deep to compile (at most %d)." % (formula.height, MAX_HEIGHT))
+    if not Signature(signature).verify(formula):
+        raise ValueError("Formula '%s' does not match the signature." % formula)
+    names = sorted(free(formula))
+    scope = {name: i for i, name in enumerate(names)}
+    depth = [len(names)]
+    f = _formula(formula, scope, len(names), depth)
+    padding = [None] * (depth[0] - len(names))
+
+    def check(structure, allocation=None):
+        if allocation is None:
+            allocation = {}
+        elif isinstance(allocation, FO.Allocation):
+            allocation = allocation.a
+        return f(structure, [allocation[name] for name in names] + padding)
+
+    check.formula = formula
+    check.free = names
+    return check
+
+# Compile a formula. "scope" maps variable names to their slots, "slot" is the
+# first unused slot and "depth" records the highest slot count ever needed.
+def _formula(x, scope, slot, depth):
+    if x.__class__ in (FO.Exists, FO.Forall):
+        inner = dict(scope)
+        inner[x.variable.name] = slot
+        depth[0] = max(depth[0], slot + 1)
+        f = _formula(x.formula, inner, slot + 1, depth)
+        if x.__class__ is FO.Exists:
+            def exists(s, env):
+                for element in s.universe:
+                    env[slot] = element
+                    if f(s, env):
+                        return True
+                return False
+            return exists
+        else:
+            def forall(s, env):
+                for element in s.universe:
+                    env[slot] = element
+                    if not f(s, env):
+                        return False
+                return True
+            return forall
+    elif x.__class__ is FO.Negation:
+        f = _formula(x.formula, scope, slot, depth)
+        return lambda s, env: not f(s, env)
+    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
+        f1 = _formula(x.formula1, scope, slot, depth)
+        f2 = _formula(x.formula2, scope, slot, depth)
+        if x.__class__ is FO.And:
+            return lambda s, env: f1(s, env) and f2(s, env)
+        elif x.__class__ is FO.Or:
+            return lambda s, env: f1(s, env) or f2(s, env)
+        elif x.__class__ is FO.Implies:
+            return lambda s, env: not f1(s, env) or f2(s, env)
+        else:
+            return lambda s, env: f1(s, env) == f2(s, env)
+    elif x.__class__ is FO.Equals:
+        t1, t2 = _term(x.term1, scope), _term(x.term2, scope)
+        return lambda s, env: t1(s, env) is t2(s, env)
+    elif x.__class__ is FO.Relation:
+        symbol = x.symbol
+        # The common case of an atom over variables only is specialized,
+        # so that the tuple is read straight from the environment.
+        if all(t.__class__ in (FO.Variable, FO.Bound) for t in x.terms):
+            slots = [scope[t.name] for t in x.terms]
+            if len(slots) == 1:
+                i, = slots
+                return lambda s, env: (env[i],) in s.relations[symbol]
+            elif len(slots) == 2:
+                i, j = slots
+                return lambda s, env: (env[i], env[j]) in s.relations[symbol]
+            return lambda s, env: tuple([env[i] for i in slots]) in s.relations[symbol]
+        terms = [_term(t, scope) for t in x.terms]
+        return lambda s, env: tuple([t(s, env) for t in terms]) in s.relations[symbol]
+    raise ValueError("Cannot compile '%s'." % x)
+
+def _term(x, scope):
+    # Resolved Bound terms keep their name, which the scope resolves the same way.
+    if x.__class__ in (FO.Variable, FO.Bound):
+        i = scope[x.name]
+        return lambda s, env: env[i]
+    elif x.__class__ is FO.Constant:
+        constant = x.constant
+        return lambda s, env: s.constants[constant]
+    elif x.__class__ is FO.Function:
+        symbol = x.symbol
+        terms = [_term(t, scope) for t in x.terms]
+        return lambda s, env: s.functions[symbol].evaluate(tuple([t(s, env) for t in terms]))
+    raise ValueError("Cannot compile term '%s'." % x)
@@ -1,28 +1,25 @@
+from collections import deque
+
 import core as FO
+from traversal import fold, rewrite
+
+# All transformations are folds or bottom-up rewrites over the formula (see
+# traversal.py), so they run in linear time and without recursion, and do the
+# work only once for subformulas that occur several times.
 
-def union(sets):
-    if len(sets) > 1:
-        return sets[0].union(union(sets[1:]))
-    else:
-        return sets[0]
-        
 class signature:
     def __init__(self, symbols):
         self.symbols = symbols
-        
+
     def verify(self, x):
-        if x.__class__ in (FO.Exists, FO.Forall):
-            return self.verify(x.formula)
-        elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-            return self.verify(x.formula1) and self.verify(x.formula2)
-        elif x.__class__ is FO.Function:
-            return x.symbol in self.symbols and ('function', len(x.terms)) == self.symbols[x.symbol] and all([self.verify(t) for t in x.terms])
+        return fold(x, lambda y, valid: all(valid) and self.check(y))
+
+    # Check the symbol of a single node.
+    def check(self, x):
+        if x.__class__ is FO.Function:
+            return x.symbol in self.symbols and ('function', len(x.terms)) == self.symbols[x.symbol]
         elif x.__class__ is FO.Relation:
-            return x.symbol in self.symbols and ('relation', len(x.terms)) == self.symbols[x.symbol] and all([self.verify(t) for t in x.terms])
-        elif x.__class__ is FO.Equals:
-            return self.verify(x.term1) and self.verify(x.term2)
-        elif x.__class__ is FO.Negation:
-            return self.verify(x.formula)
+            return x.symbol in self.symbols and ('relation', len(x.terms)) == self.symbols[x.symbol]
         elif x.__class__ is FO.Constant:
             return x.constant in self.symbols and self.symbols[x.constant] == 'constant'
         else:
@@ -30,164 +27,307 @@ class signature:
 
 
 def unimply(formula):
-    if formula.__class__ in (FO.And, FO.Or):
-        return formula.__class__(unimply(formula.formula1), unimply(formula.formula1))
-    elif formula.__class__ in (FO.Exists, FO.Forall):
-        return formula.__class__(formula.variable, unimply(formula.formula))
-    elif formula.__class__ is FO.Equivalent:
-        f1, f2 = unimply(formula.formula1), unimply(formula.formula2)
-        return FO.Or(FO.And(f1, f2), FO.And(FO.Negation(f1), FO.Negation(f2)))
-    elif formula.__class__ is FO.Implies:
-        return FO.Or(FO.Negation(unimply(formula.formula1)), unimply(formula.formula2))
-    else:
-        return formula
-        
+    def f(x):
+        if x.__class__ is FO.Equivalent:
+            f1, f2 = x.formula1, x.formula2
+            return FO.Or(FO.And(f1, f2), FO.And(FO.Negation(f1), FO.Negation(f2)))
+        elif x.__class__ is FO.Implies:
+            return FO.Or(FO.Negation(x.formula1), x.formula2)
+        else:
+            return x
+    return rewrite(formula, f)
+
 def unequiv(formula):
-    if formula.__class__ in (FO.And, FO.Or, FO.Implies):
-        return formula.__class__(unequiv(formula.formula1), unequiv(formula.formula1))
-    elif formula.__class__ in (FO.Exists, FO.Forall):
-        return formula.__class__(formula.variable, unequiv(formula.formula))
-    elif formula.__class__ is FO.Equivalent:
-        f1, f2 = unequiv(formula.formula1), unequiv(formula.formula2)
-        return FO.And(FO.Implies(f1, f2), FO.Implies(f2, f1))
-    else:
-        return formula
+    def f(x):
+        if x.__class__ is FO.Equivalent:
+            f1, f2 = x.formula1, x.formula2
+            return FO.And(FO.Implies(f1, f2), FO.Implies(f2, f1))
+        else:
+            return x
+    return rewrite(formula, f)
 
 def unall(x):
-    if x.__class__ is FO.Forall:
-        return FO.Negation(FO.Exists(x.variable, FO.Negation(x.formula)))
-    elif x.__class__ is FO.Exists:
-        return FO.Exists(x.variable, unall(x.formula))
-    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-        return x.__class__(unall(x.formula1), unall(x.formula2))
-    elif x.__class__ is FO.Negation:
-        return FO.Negation(unall(x.formula))
-    else:
-        return x
+    def f(y):
+        if y.__class__ is FO.Forall:
+            return FO.Negation(FO.Exists(y.variable, FO.Negation(y.formula)))
+        else:
+            return y
+    return rewrite(x, f)
 
 def substitute(variable_name, term, x):
-    if x.__class__ in (FO.Exists, FO.Forall):
-        if x.variable.name != variable_name:
-            return x.__class__(x.variable, substitute(variable_name, term, x.formula))
+    def f(y):
+        if y.__class__ is FO.Variable and y.name == variable_name:
+            return term
         else:
-            return x
-    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-        return x.__class__(substitute(variable_name, term, x.formula1), substitute(variable_name, term, x.formula2))
-    elif x.__class__ in (FO.Relation, FO.Function):
-        return x.__class__(x.symbol, list(map(lambda y:substitute(variable_name, term, y), x.terms)))
-    elif x.__class__ is FO.Equals:
-        return x.__class__(substitute(variable_name, term, x.term1), substitute(variable_name, term, x.term2))
-    elif x.__class__ is FO.Variable and x.name == variable_name:
-        return term
-    elif x.__class__ is FO.Negation:
-        return x.__class__(substitute(variable_name, term, x.formula))
-    else:
-        return x
+            return y
+    # Subformulas without the variable (including those that bind it) are left alone.
+    return rewrite(x, f, lambda y: variable_name in y.free_vars)
 
+# The variable sets are cached on the formula nodes.
 def free(x):
-    if x.__class__ in (FO.Exists, FO.Forall):
-        return free(x.formula).difference({x.variable.name})
-    elif x.__class__ is FO.Negation:
-        return free(x.formula)
-    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-        return free(x.formula1).union(free(x.formula2))
-    elif x.__class__ in (FO.Function, FO.Relation):
-        return union([free(term) for term in x.terms])
-    elif x.__class__ is FO.Equals:
-        return free(x.term1).union(free(x.term2))
-    elif x.__class__ is FO.Variable:
-        return {x.name}
-    else:
-        return set()
-        
+    return x.free_vars
+
 def var(x):
-    if x.__class__ in (FO.Exists, FO.Forall):
-        return var(x.formula).union({x.variable.name})
-    elif x.__class__ is FO.Negation:
-        return var(x.formula)
-    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-        return var(x.formula1).union(var(x.formula2))
-    elif x.__class__ in (FO.Function, FO.Relation):
-        return union([var(term) for term in x.terms])
-    elif x.__class__ is FO.Equals:
-        return var(x.term1).union(free(x.term2))
-    elif x.__class__ is FO.Variable:
-        return {x.name}
-    else:
-        return set()
-        
+    return x.all_vars
+
 def nnf(x):
-    if x.__class__ in (FO.Implies, FO.Equivalent):
-        return nnf(unimply(x))
-    elif x.__class__ is FO.Negation:
-        y = x.formula
+    # Compute the NNF of every subformula together with the NNF of its negation.
+    def leave(y, pairs):
+        if pairs is None:
+            return y, None if isinstance(y, FO.Term) else FO.Negation(y)
+        elif y.__class__ is FO.Negation:
+            (p, n), = pairs
+            return n, p
+        elif y.__class__ in quantors:
+            p, n = pairs[1]
+            return y.__class__(y.variable, p), dual[y.__class__](y.variable, n)
+        (p1, n1), (p2, n2) = pairs
         if y.__class__ is FO.And:
-            return FO.Or(nnf(FO.Negation(y.formula1)), nnf(FO.Negation(y.formula2)))
+            return FO.And(p1, p2), FO.Or(n1, n2)
         elif y.__class__ is FO.Or:
-            return FO.And(nnf(FO.Negation(y.formula1)), nnf(FO.Negation(y.formula2)))
-        elif y.__class__ is FO.Exists:
-            return FO.Forall(y.variable, nnf(FO.Negation(y.formula)))
-        elif y.__class__ is FO.Forall:
-            return FO.Exists(y.variable, nnf(FO.Negation(y.formula)))
+            return FO.Or(p1, p2), FO.And(n1, n2)
+        elif y.__class__ is FO.Implies:
+            return FO.Or(n1, p2), FO.And(p1, n2)
+        else:
+            return FO.Or(FO.And(p1, p2), FO.And(n1, n2)), FO.And(FO.Or(n1, n2), FO.Or(p1, p2))
+    return fold(x, leave, lambda y: y.__class__ not in atoms)[0]
+
+quantors = (FO.Exists, FO.Forall)
+# Atoms and quantified variables contain no connectives and need not be entered.
+atoms = (FO.Relation, FO.Equals, FO.Variable)
+dual = {FO.Forall: FO.Exists, FO.Exists: FO.Forall}
+
+# Bring a formula into prenex normal form in linear time.
+#
+# First all bound variables are renamed apart, so that no two quantifiers
+# bind the same name and no bound name is also free. Then every quantifier
+# can be moved to the front: one traversal strips the quantifiers from the
+# matrix and records each of them, with its type flipped under negations
+# and in antecedents of implications.
+#
+# Quantifiers in separate subformulas are independent, so only the nesting
+# order must be kept in the prefix. With first=None they are listed in their
+# order in the formula. With first=FO.Exists or first=FO.Forall, as many
+# quantifiers of one type are taken as possible before switching to the
+# other, starting with the given type; this keeps alternations few.
+def prenex(x, first=None):
+    x = rename_apart(unequiv(x))
+    quantifiers = []
+    out = []
+    stack = [(x, True, None, False)]
+    while stack:
+        y, positive, parent, done = stack.pop()
+        if done:
+            n = 1 if y.__class__ is FO.Negation else 2
+            children = out[len(out)-n:]
+            del out[len(out)-n:]
+            out.append(y.rebuild(children))
+        elif y.__class__ in quantors:
+            q = y.__class__ if positive else dual[y.__class__]
+            quantifiers.append((q, y.variable, parent))
+            stack.append((y.formula, positive, len(quantifiers) - 1, False))
         elif y.__class__ is FO.Negation:
-            return nnf(y.formula)
+            stack.append((y, positive, parent, True))
+            stack.append((y.formula, not positive, parent, False))
+        elif y.__class__ in (FO.And, FO.Or, FO.Implies):
+            stack.append((y, positive, parent, True))
+            stack.append((y.formula2, positive, parent, False))
+            stack.append((y.formula1, positive if y.__class__ is not FO.Implies else not positive, parent, False))
         else:
-            return x
-    elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
-        return x.__class__(nnf(x.formula1), nnf(x.formula2))
-    elif x.__class__ in (FO.Exists, FO.Forall):
-        return x.__class__(x.variable, nnf(x.formula))
-    else:
-        return x
-
-def prenex(x, depth = 0):
-    #print ((">    "*depth) + str(x) + "     ")
-    if x.__class__ is FO.Equivalent:
-        return prenex(unequiv(x), depth+1)
-    if x.__class__ in (FO.And, FO.Or, FO.Implies):
-        f1, f2 = prenex(x.formula1, depth+1), prenex(x.formula2, depth+1)
-        
-        # If no quantors, pass.
-        if {f1.__class__, f2.__class__}.intersection({FO.Forall, FO.Exists}) == set():
-            return x
-        # Remove variable conflicts.
-        if f1.__class__ in (FO.Forall, FO.Exists):
-            f = free(f2)
-            if f1.variable.name in f:
-                n = FO.Variable(nextvar(f1.variable.name, var(f1)))
-                f1 = f1.__class__(n, substitute(f1.variable.name, n, f1.formula))
-        elif f2.__class__ in (FO.Forall, FO.Exists):
-            f = free(f1)
-            if f2.variable.name in f:
-                n = FO.Variable(nextvar(f2.variable.name, var(f2)))
-                f2 = f2.__class__(n, substitute(f2.variable.name, n, f2.formula))
-        
-        # Removing quantors from either part of &&,||
-        if x.__class__ in (FO.And, FO.Or):
-            if f1.__class__ in (FO.Forall, FO.Exists):
-                out = f1.__class__(f1.variable, prenex(x.__class__(f1.formula, f2), depth+1))
-            else:
-                out = f2.__class__(f2.variable, prenex(x.__class__(f1, f2.formula), depth+1))
-            #print("<    "*depth + str(out))
-            return out
-        
-        # Removing quantors from antecedent of implication:
-        if f1.__class__ in (FO.Forall, FO.Exists):
-            rev = {FO.Forall:FO.Exists, FO.Exists:FO.Forall}
-            return rev[f1.__class__](f1.variable, prenex(x.__class__(f1.formula, f2)))
+            out.append(y)
+    return wrap(order(quantifiers, first), out[0])
+
+# Arrange the quantifiers (quantor, variable, parent) into a prefix. Each
+# quantifier must follow the one it was nested in, given by the index parent.
+def order(quantifiers, first):
+    if first is None:
+        return [(q, v) for (q, v, parent) in quantifiers]
+    children = [[] for _ in quantifiers]
+    available = {FO.Exists: deque(), FO.Forall: deque()}
+    for i, (q, v, parent) in enumerate(quantifiers):
+        if parent is None:
+            available[q].append(i)
+        else:
+            children[parent].append(i)
+    prefix, current = [], first
+    while available[FO.Exists] or available[FO.Forall]:
+        if not available[current]:
+            current = dual[current]
+        i = available[current].popleft()
+        prefix.append(quantifiers[i][:2])
+        for j in children[i]:
+            available[quantifiers[j][0]].append(j)
+    return prefix
+
+# Rename bound variables so that every quantifier binds a different name,
+# which is not free anywhere in the formula. The first quantifier of each
+# name keeps it, if possible; the others get the name followed by a number.
+def rename_apart(x):
+    fresh = supply(variables(x))
+    used = set(x.free_vars)
+
+    # The tree is walked with an explicit stack; names maps each original
+    # name to the new names of the quantifiers currently binding it.
+    out, names = [], {}
+    stack = [(x, False)]
+    while stack:
+        y, done = stack.pop()
+        if done:
+            n = len(tuple(y.children()))
+            children = out[len(out)-n:]
+            del out[len(out)-n:]
+            out.append(y.rebuild(children))
+            if y.__class__ in quantors:
+                names[y.variable.name].pop()
+        elif y.__class__ is FO.Variable:
+            out.append(FO.Variable(names[y.name][-1]) if names.get(y.name) else y)
+        elif y.__class__ in quantors:
+            name = y.variable.name
+            new = fresh(name) if name in used else name
+            used.add(new)
+            names.setdefault(name, []).append(new)
+            out.append(FO.Variable(new))
+            stack.append((y, True))
+            stack.append((y.formula, False))
         else:
-            return f2.__class__(f2.variable, prenex(x.__class__(f1, f2.formula)))
-    elif x.__class__ is FO.Negation:
-        y = prenex(x.formula)
+            stack.append((y, True))
+            stack.extend((c, False) for c in reversed(tuple(y.children())))
+    return out[0]
+
+def wrap(prefix, matrix):
+    for q, v in reversed(prefix):
+        matrix = q(v, matrix)
+    return matrix
+
+# Return a function that supplies fresh names: for a base name, the base
+# followed by a number, counting up per base and skipping reserved names.
+def supply(reserved):
+    reserved = set(reserved)
+    counters = {}
+    def fresh(base):
+        k = counters.get(base, 0) + 1
+        while '%s%d' % (base, k) in reserved:
+            k += 1
+        counters[base] = k
+        reserved.add('%s%d' % (base, k))
+        return '%s%d' % (base, k)
+    return fresh
+
+# Convert a formula into clausal form, for clause-based provers and solvers.
+#
+# The formula is brought into negation normal form and its bound variables
+# are renamed apart. Each existential quantifier is replaced by a Skolem
+# function (or constant) of the universal variables its subformula depends
+# on, which are fewer than in prenex form. The remaining quantifiers are all
+# universal, and the formula is converted to CNF with definitional (Tseitin)
+# atoms instead of by distribution. Only one direction of each definition is
+# needed, since the formula is in NNF. The universal quantifiers are dropped
+# as the clauses are built: since the variables are renamed apart, a
+# quantifier below a disjunction can be moved to the front of its clause.
+# The clause set is satisfiable if and only if the formula is.
+#
+# A definitional atom takes the variables that are free in the subformula it
+# stands for, with the universal quantifiers inside that subformula still in
+# place. The number of literals is linear in the size of the formula. The
+# size of the atoms is linear as long as the number of free variables of
+# each subformula is bounded, and at worst quadratic.
+#
+# The result is a pair (clauses, table). Each clause is a tuple of nonzero
+# integers; the literal i stands for the atom table[i-1], and -i for its
+# negation. All variables in the clauses are universally quantified, and so
+# are the free variables of the formula. The definitional atoms are relations
+# over the free variables of the subformula they stand for. New symbols are
+# named sk1, sk2, ... and def1, def2, ..., avoiding the symbols in the formula.
+def to_clauses(x):
+    x = rename_apart(nnf(x))
+    fresh = supply(symbols(x))
+
+    # The universal variables that each variable depends on.
+    depends = {name: frozenset((name,)) for name in x.free_vars}
+    skolem = {}
+    stack = [x]
+    while stack:
+        y = stack.pop()
+        if y.__class__ is FO.Forall:
+            depends[y.variable.name] = frozenset((y.variable.name,))
+        elif y.__class__ is FO.Exists:
+            names = sorted(frozenset().union(*(depends[name] for name in y.free_vars)))
+            if names:
+                skolem[y.variable.name] = FO.Function(fresh('sk'), [FO.Variable(name) for name in names])
+            else:
+                skolem[y.variable.name] = FO.Constant(fresh('sk'))
+            depends[y.variable.name] = frozenset(names)
+        if y.__class__ not in atoms:
+            stack.extend(y.children())
+    def f(y):
         if y.__class__ is FO.Exists:
-            return FO.Forall(y.variable, prenex(FO.Negation(y.formula)))
+            return y.formula
+        elif y.__class__ is FO.Variable:
+            return skolem.get(y.name, y)
+        return y
+    x = rewrite(x, f)
+
+    table, index = [], {}
+    def literal(y):
+        negative = y.__class__ is FO.Negation
+        if negative:
+            y = y.formula
+        if y not in index:
+            table.append(y)
+            index[y] = len(table)
+        return -index[y] if negative else index[y]
+
+    # Each task (p, y) asks for clauses that make y true wherever the
+    # definitional literal p is, or unconditionally if p is None.
+    clauses, defined = [], {}
+    tasks = [(None, x)]
+    while tasks:
+        p, y = tasks.pop()
+        if y.__class__ is FO.And:
+            tasks.append((p, y.formula2))
+            tasks.append((p, y.formula1))
+            continue
         elif y.__class__ is FO.Forall:
-            return FO.Exists(y.variable, prenex(FO.Negation(y.formula)))
-    elif x.__class__ in (FO.Exists, FO.Forall):
-        return x.__class__(x.variable, prenex(x.formula))
-    return x
-        
-def nextvar(name, reserved):
-    while name in reserved:
-        name += "'"
-    return name
+            tasks.append((p, y.formula))
+            continue
+        clause = [] if p is None else [-p]
+        disjuncts = [y]
+        while disjuncts:
+            d = disjuncts.pop()
+            if d.__class__ is FO.Or:
+                disjuncts.append(d.formula2)
+                disjuncts.append(d.formula1)
+            elif d.__class__ is FO.Forall:
+                disjuncts.append(d.formula)
+            elif d.__class__ is FO.And:
+                if d not in defined:
+                    arguments = [FO.Variable(name) for name in sorted(d.free_vars)]
+                    defined[d] = literal(FO.Relation(fresh('def'), arguments))
+                    tasks.append((defined[d], d))
+                clause.append(defined[d])
+            else:
+                clause.append(literal(d))
+        clauses.append(tuple(clause))
+    return clauses, table
+
+# The variable names of a formula, collected in one pass. Unlike var(), this
+# does not cache a set on every subformula, which takes quadratic space on
+# deeply nested formulas.
+def variables(x):
+    result = set()
+    def leave(y, values):
+        if y.__class__ in (FO.Variable, FO.Bound):
+            result.add(y.name)
+    fold(x, leave)
+    return result
+
+# The relation, function and constant symbols of a formula.
+def symbols(x):
+    names = set()
+    def leave(y, values):
+        if y.__class__ in (FO.Relation, FO.Function):
+            names.add(y.symbol)
+        elif y.__class__ is FO.Constant:
+            names.add(y.constant)
+    fold(x, leave)
+    return names
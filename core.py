@@ -1,134 +1,428 @@
 # Christoph Burschka, 2012
 
 from copy import copy
+from weakref import WeakValueDictionary
 
-class Formula:
-  def __init__(self):
-    pass
+from traversal import fold
 
-class Term:
-  def __init__(self):
-    pass
+# Formulas at most this high are evaluated by plain recursion; higher ones
+# are stepped through with an explicit stack, see Node.evaluate().
+RECURSION_HEIGHT = 200
 
+# Formulas and terms are immutable and hash-consed: constructing a node that
+# is structurally equal to a live node returns that very object. Equal nodes
+# are therefore identical, so equality is identity, the structural hash is
+# computed once on construction, and nodes can key identity-based caches.
+# The fields of each class are its __slots__, in constructor order.
+#
+# Since nodes never change, their sets of free variables and of all variable
+# names, and their height, are computed on first use from those of their
+# children, and cached.
+class Node:
+  __slots__ = ('_hash', '_free', '_vars', '_height', '_resolved', '__weakref__')
+  nodes = WeakValueDictionary()
+
+  def __new__(cls, *args):
+    if len(args) != len(cls.__slots__):
+      raise TypeError('%s takes %d arguments (%d given)' % (cls.__name__, len(cls.__slots__), len(args)))
+    # Other fields are keyed with their type, since values such as 1, 1.0
+    # and True are equal but must not share a node.
+    key = (cls,) + tuple(x if isinstance(x, Node) or x.__class__ is tuple else (x.__class__, x) for x in args)
+    node = Node.nodes.get(key)
+    if node is None:
+      node = object.__new__(cls)
+      for name, value in zip(cls.__slots__, args):
+        object.__setattr__(node, name, value)
+      object.__setattr__(node, '_hash', hash(key))
+      Node.nodes[key] = node
+    return node
+
+  def __hash__(self):
+    return self._hash
+
+  def __setattr__(self, name, value):
+    raise AttributeError('%s is immutable.' % self.__class__.__name__)
+
+  def __delattr__(self, name):
+    raise AttributeError('%s is immutable.' % self.__class__.__name__)
+
+  # Pickling and copying go through the constructor, and thus the intern table.
+  # The node is flattened into its distinct subnodes in post-order, each
+  # given by its class and fields, where a subnode is replaced by its
+  # position in the list. Nested nodes would make the pickler recurse once
+  # per level of the formula.
+  def __reduce__(self):
+    entries, positions = [], {}
+    def leave(x, values):
+      fields = []
+      for name in x.__slots__:
+        value = getattr(x, name)
+        if isinstance(value, Node):
+          fields.append((NODE, positions[value]))
+        elif value.__class__ is tuple:
+          fields.append((NODES, tuple(positions[c] for c in value)))
+        else:
+          fields.append((VALUE, value))
+      positions[x] = len(entries)
+      entries.append((x.__class__, tuple(fields)))
+    fold(self, leave)
+    return unflatten, (entries,)
+
+  # The formulas and terms directly below this node.
+  def children(self):
+    for name in self.__slots__:
+      value = getattr(self, name)
+      if isinstance(value, Node):
+        yield value
+      elif value.__class__ is tuple:
+        yield from value
+
+  # Return a node of the same class and with the same fields, but with the
+  # given children in place of the current ones.
+  def rebuild(self, children):
+    old = tuple(self.children())
+    if len(old) == len(children) and all(a is b for a, b in zip(old, children)):
+      return self
+    children = iter(children)
+    args = []
+    for name in self.__slots__:
+      value = getattr(self, name)
+      if isinstance(value, Node):
+        value = next(children)
+      elif value.__class__ is tuple:
+        value = tuple(next(children) for _ in value)
+      args.append(value)
+    return self.__class__(*args)
+
+  # Return a cached attribute, first computing it for this node and all of its
+  # uncached descendants, bottom-up. compute(node, values) derives the value
+  # of a node from those of its children.
+  def cached(self, attr, compute):
+    value = getattr(self, attr, None)
+    if value is None:
+      def leave(x, values):
+        if values is None:
+          return getattr(x, attr)
+        value = compute(x, values)
+        object.__setattr__(x, attr, value)
+        return value
+      value = fold(self, leave, lambda x: getattr(x, attr, None) is None)
+    return value
+
+  @property
+  def free_vars(self):
+    return self.cached('_free', lambda x, sets: x.compute_free(sets))
+
+  @property
+  def all_vars(self):
+    return self.cached('_vars', lambda x, sets: x.compute_vars(sets))
+
+  @property
+  def height(self):
+    return self.cached('_height', lambda x, heights: 1 + max(heights, default=0))
+
+  # The node with its bound variables resolved to slots (see resolve()),
+  # computed on first use.
+  @property
+  def resolved(self):
+    value = getattr(self, '_resolved', None)
+    if value is None:
+      value = resolve(self)
+      object.__setattr__(self, '_resolved', value)
+    return value
+
+  def compute_free(self, sets):
+    return frozenset().union(*sets)
+
+  def compute_vars(self, sets):
+    return frozenset().union(*sets)
+
+  # Evaluate the formula or term. Each class implements this twice:
+  # _evaluate() recurses into the children directly, while steps() is a
+  # generator that yields each child it needs evaluated and receives its
+  # value. Formulas whose height could exhaust the Python stack are evaluated
+  # by driving the steps() generators from a stack; shallow children are
+  # still handed to _evaluate(). The resolved node is evaluated, so that
+  # bound variables are read from their slots without a search by name.
+  def evaluate(self, structure, allocation):
+    x = self.resolved
+    if x.height <= RECURSION_HEIGHT:
+      return x._evaluate(structure, allocation)
+    stack = [x.steps(structure, allocation)]
+    value = None
+    while stack:
+      try:
+        child = stack[-1].send(value)
+      except StopIteration as stop:
+        stack.pop()
+        value = stop.value
+        continue
+      if child.height <= RECURSION_HEIGHT:
+        value = child._evaluate(structure, allocation)
+      else:
+        stack.append(child.steps(structure, allocation))
+        value = None
+    return value
+
+  # Leaves have no children to step through.
+  def steps(self, structure, allocation):
+    return self._evaluate(structure, allocation)
+    yield
+
+  # The string is assembled from the pieces() of each node: nodes are
+  # expanded in place, anything else is converted with str().
+  def __str__(self):
+    out, stack = [], [self]
+    while stack:
+      x = stack.pop()
+      if isinstance(x, Node):
+        stack.extend(reversed(x.pieces()))
+      else:
+        out.append(str(x))
+    return ''.join(out)
+
+# The kinds of fields in a flattened node (see Node.__reduce__).
+NODE, NODES, VALUE = range(3)
+
+def unflatten(entries):
+  nodes = []
+  for cls, fields in entries:
+    args = []
+    for kind, value in fields:
+      if kind == NODE:
+        value = nodes[value]
+      elif kind == NODES:
+        value = tuple(nodes[i] for i in value)
+      args.append(value)
+    nodes.append(cls(*args))
+  return nodes[-1]
+
+class Formula(Node):
+  __slots__ = ()
+
+class Term(Node):
+  __slots__ = ()
 
 class Exists(Formula):
-  def __init__(self, variable, formula):
-    self.variable = variable
-    self.formula = formula
+  __slots__ = ('variable', 'formula')
     
-  def evaluate(self, structure, allocation):
-    for element in structure.universe:
-      if self.formula.evaluate(structure, allocation.extend(self.variable, element)):
-        return True
-    return False
+  def _evaluate(self, structure, allocation):
+    names, values = allocation.names, allocation.values
+    names.append(self.variable.name)
+    values.append(None)
+    try:
+      for element in self.domain(structure, allocation):
+        values[-1] = element
+        if self.formula._evaluate(structure, allocation):
+          return True
+      return False
+    finally:
+      names.pop()
+      values.pop()
+
+  def steps(self, structure, allocation):
+    names, values = allocation.names, allocation.values
+    names.append(self.variable.name)
+    values.append(None)
+    try:
+      for element in self.domain(structure, allocation):
+        values[-1] = element
+        if (yield self.formula):
+          return True
+      return False
+    finally:
+      names.pop()
+      values.pop()
+
+  # A witness of ∃x R(..x..) or ∃x (R(..x..) ∧ φ) must satisfy the atom,
+  # so only the matching elements need to be tried.
+  def domain(self, structure, allocation):
+    body = self.formula
+    if body.__class__ is Relation:
+      guards = [body]
+    elif body.__class__ is And:
+      guards = [body.formula1, body.formula2]
+    else:
+      guards = []
+    for atom in guards:
+      candidates = guard(self.variable.name, atom, structure, allocation)
+      if candidates is not None:
+        return candidates
+    return structure.universe
   
-  def __str__(self):
-    return '∃' + str(self.variable) + ' ' + str(self.formula)
+  def compute_free(self, sets):
+    return sets[1] - {self.variable.name}
+
+  def pieces(self):
+    return ['∃', self.variable, ' ', self.formula]
     
 class Constant(Term):
-  def __init__(self, constant):
-    self.constant = constant
+  __slots__ = ('constant',)
     
-  def evaluate(self, structure, allocation):
-    return structure.constants[constant]
+  def _evaluate(self, structure, allocation):
+    return structure.constants[self.constant]
     
-  def __str__(self):
-    return str(self.constant)
+  def pieces(self):
+    return [self.constant]
 
 class Forall(Formula):
-  def __init__(self, variable, formula):
-    self.variable = variable
-    self.formula = formula
+  __slots__ = ('variable', 'formula')
 
-  def evaluate(self, structure, allocation):
-    for element in structure.universe:
-      if not self.formula.evaluate(structure, allocation.extend(self.variable, element)):
-        return False
-    return True
+  def _evaluate(self, structure, allocation):
+    names, values = allocation.names, allocation.values
+    names.append(self.variable.name)
+    values.append(None)
+    try:
+      for element in self.domain(structure, allocation):
+        values[-1] = element
+        if not self.formula._evaluate(structure, allocation):
+          return False
+      return True
+    finally:
+      names.pop()
+      values.pop()
 
-  def __str__(self):
-    return '∀' + str(self.variable) + ' ' + str(self.formula)
+  def steps(self, structure, allocation):
+    names, values = allocation.names, allocation.values
+    names.append(self.variable.name)
+    values.append(None)
+    try:
+      for element in self.domain(structure, allocation):
+        values[-1] = element
+        if not (yield self.formula):
+          return False
+      return True
+    finally:
+      names.pop()
+      values.pop()
+
+  # ∀x ¬R(..x..), ∀x (R(..x..) → φ) and ∀x (¬R(..x..) ∨ φ) hold vacuously
+  # for every element that does not satisfy the atom, so only the others
+  # need to be checked.
+  def domain(self, structure, allocation):
+    body = self.formula
+    if body.__class__ is Negation:
+      guards = [body.formula]
+    elif body.__class__ is Implies:
+      guards = [body.formula1]
+    elif body.__class__ is Or:
+      guards = [f.formula for f in (body.formula1, body.formula2) if f.__class__ is Negation]
+    else:
+      guards = []
+    for atom in guards:
+      candidates = guard(self.variable.name, atom, structure, allocation)
+      if candidates is not None:
+        return candidates
+    return structure.universe
+
+  def compute_free(self, sets):
+    return sets[1] - {self.variable.name}
+
+  def pieces(self):
+    return ['∀', self.variable, ' ', self.formula]
 
 class Negation(Formula):
-  def __init__(self, formula):
-    self.formula = formula
+  __slots__ = ('formula',)
 
-  def evaluate(self, structure, allocation):
-    return not self.formula.evaluate(structure, allocation)
-  def __str__(self):
-    return '¬' + str(self.formula)
+  def _evaluate(self, structure, allocation):
+    return not self.formula._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return not (yield self.formula)
+  def pieces(self):
+    return ['¬', self.formula]
 
 class Or(Formula):
-  def __init__(self, formula1, formula2):
-    self.formula1 = formula1
-    self.formula2 = formula2
+  __slots__ = ('formula1', 'formula2')
 
-  def evaluate(self, structure, allocation):
-    return self.formula1.evaluate(structure, allocation) or self.formula2.evaluate(structure, allocation)
-  def __str__(self):
-    return '(' + str(self.formula1) + ' ∨ ' + str(self.formula2) + ')'
+  def _evaluate(self, structure, allocation):
+    return self.formula1._evaluate(structure, allocation) or self.formula2._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return (yield self.formula1) or (yield self.formula2)
+  def pieces(self):
+    return ['(', self.formula1, ' ∨ ', self.formula2, ')']
 
 class And(Formula):
-  def __init__(self, formula1, formula2):
-    self.formula1 = formula1
-    self.formula2 = formula2
+  __slots__ = ('formula1', 'formula2')
 
-  def evaluate(self, structure, allocation):
-    return self.formula1.evaluate(structure, allocation) and self.formula2.evaluate(structure, allocation)
-  def __str__(self):
-    return '(' + str(self.formula1) + ' ∧ ' + str(self.formula2) + ')'
+  def _evaluate(self, structure, allocation):
+    return self.formula1._evaluate(structure, allocation) and self.formula2._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return (yield self.formula1) and (yield self.formula2)
+  def pieces(self):
+    return ['(', self.formula1, ' ∧ ', self.formula2, ')']
 class Implies(Formula):
-  def __init__(self, formula1, formula2):
-    self.formula1 = formula1
-    self.formula2 = formula2
+  __slots__ = ('formula1', 'formula2')
 
-  def evaluate(self, structure, allocation):
-    return not self.formula1.evaluate(structure, allocation) or self.formula2.evaluate(structure, allocation)
-  def __str__(self):
-    return '(' + str(self.formula1) + ' → ' + str(self.formula2) + ')'
+  def _evaluate(self, structure, allocation):
+    return not self.formula1._evaluate(structure, allocation) or self.formula2._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return not (yield self.formula1) or (yield self.formula2)
+  def pieces(self):
+    return ['(', self.formula1, ' → ', self.formula2, ')']
 
 class Equivalent(Formula):
-  def __init__(self, formula1, formula2):
-    self.formula1 = formula1
-    self.formula2 = formula2
+  __slots__ = ('formula1', 'formula2')
 
-  def evaluate(self, structure, allocation):
-    return self.formula1.evaluate(structure, allocation) == self.formula2.evaluate(structure, allocation)
-    
-  def __str__(self):
-    return '(' + str(self.formula1) + ' ↔ ' + str(self.formula2) + ')'
+  def _evaluate(self, structure, allocation):
+    return self.formula1._evaluate(structure, allocation) == self.formula2._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return (yield self.formula1) == (yield self.formula2)
+  def pieces(self):
+    return ['(', self.formula1, ' ↔ ', self.formula2, ')']
 
 class Equals(Formula):
-  def __init__(self, term1, term2):
-    self.term1 = term1
-    self.term2 = term2
+  __slots__ = ('term1', 'term2')
 
-  def evaluate(self, structure, allocation):
-    return self.term1.evaluate(structure, allocation) is self.term2.evaluate(structure, allocation)
-    
-  def __str__(self):
-    return str(self.term1) + '=' + str(self.term2)
+  def _evaluate(self, structure, allocation):
+    return self.term1._evaluate(structure, allocation) is self.term2._evaluate(structure, allocation)
+  def steps(self, structure, allocation):
+    return (yield self.term1) is (yield self.term2)
+
+  def pieces(self):
+    return [self.term1, '=', self.term2]
 
 class Relation(Formula):
-  def __init__(self, relation, terms):
-    self.symbol = relation
-    self.terms = terms
+  __slots__ = ('symbol', 'terms')
 
-  def evaluate(self, structure, allocation):
-    return tuple(map(lambda t:t.evaluate(structure, allocation), self.terms)) in structure.relations[self.symbol]
+  def __new__(cls, symbol, terms):
+    return Node.__new__(cls, symbol, tuple(terms))
+
+  def _evaluate(self, structure, allocation):
+    return tuple([t._evaluate(structure, allocation) for t in self.terms]) in structure.relations[self.symbol]
+  def steps(self, structure, allocation):
+    values = []
+    for t in self.terms:
+      values.append((yield t))
+    return tuple(values) in structure.relations[self.symbol]
     
-  def __str__(self):
-    return str(self.symbol) + '(' + ", ".join(map(str, self.terms)) + ')'
+  def pieces(self):
+    return arguments(self.symbol, self.terms)
 
 class Function(Formula):
-  def __init__(self, function, terms):
-    self.symbol = function
-    self.terms = terms
+  __slots__ = ('symbol', 'terms')
 
-  def evaluate(self, structure, allocation):
-    return structure.functions[self.symbol].evaluate(tuple(map(lambda t:t.evaluate(structure, allocation), self.terms)))
-  def __str__(self):
-    return str(self.symbol) + '(' + ", ".join(map(str, self.terms)) + ')'
+  def __new__(cls, symbol, terms):
+    return Node.__new__(cls, symbol, tuple(terms))
+
+  def _evaluate(self, structure, allocation):
+    return structure.functions[self.symbol].evaluate(tuple([t._evaluate(structure, allocation) for t in self.terms]))
+  def steps(self, structure, allocation):
+    values = []
+    for t in self.terms:
+      values.append((yield t))
+    return structure.functions[self.symbol].evaluate(tuple(values))
+  def pieces(self):
+    return arguments(self.symbol, self.terms)
+
+# The pieces of "symbol(term, ..., term)".
+def arguments(symbol, terms):
+  pieces = [symbol, '(']
+  for i, t in enumerate(terms):
+    if i:
+      pieces.append(', ')
+    pieces.append(t)
+  pieces.append(')')
+  return pieces
     
 class Structure:
   def __init__(self, universe, relations, functions, constants):
@@ -136,20 +430,163 @@ class Structure:
     self.relations = relations
     self.functions = functions
     self.constants = constants
+    self.indexes = {}
+    self.elements = None
 
+  # Group the tuples of a relation by their values at the given argument
+  # positions, eg. index('E', (0,)) maps each x to the tuples of E[x,*].
+  # Indexes are built on first use and kept, so the relations must not be
+  # modified afterwards (or the indexes must be cleared).
+  def index(self, symbol, positions):
+    key = (symbol, positions)
+    if key not in self.indexes:
+      index = {}
+      for t in self.relations[symbol]:
+        index.setdefault(tuple(t[i] for i in positions), []).append(t)
+      self.indexes[key] = index
+    return self.indexes[key]
+
+  # Map each element to its object in the universe. Equality compares
+  # elements by identity, so a value read from a relation tuple must be
+  # replaced by the universe object that is equal to it.
+  def canonical(self):
+    if self.elements is None:
+      elements = {}
+      for x in self.universe:
+        elements.setdefault(x, x)
+      self.elements = elements
+    return self.elements
+
+# Find the elements that can be assigned to a variable to satisfy a relation
+# atom, given the allocation of all other variables in it. The candidates are
+# read from an index on the positions that do not contain the variable, and
+# are the universe objects equal to them; values outside the universe are
+# dropped. Returns None if the atom does not constrain the variable this way.
+def guard(name, atom, structure, allocation):
+  if atom.__class__ is not Relation:
+    return None
+  free, bound, key = [], [], []
+  for i, t in enumerate(atom.terms):
+    if binds(t, name):
+      free.append(i)
+    elif mentions(t, name):
+      return None
+    else:
+      bound.append(i)
+      key.append(t.evaluate(structure, allocation))
+  if not free:
+    return None
+  j = free[0]
+  tuples = structure.index(atom.symbol, tuple(bound)).get(tuple(key), ())
+  elements = structure.canonical()
+  return list(dict.fromkeys(elements[t[j]] for t in tuples
+                            if t[j] in elements and all(t[i] == t[j] for i in free)))
+
+# Whether a term in the body of a quantifier is that quantifier's variable,
+# either by name or as a resolved Bound term.
+def binds(term, name):
+  return (term.__class__ is Variable and term.name == name) or (term.__class__ is Bound and term.index == 0)
+
+def mentions(term, name):
+  if term.__class__ in (Variable, Bound):
+    return binds(term, name)
+  elif term.__class__ is Function:
+    return any(mentions(t, name) for t in term.terms)
+  return False
+
+# An allocation looks up free variables by name in the dictionary a.
+# The variables of the enclosing quantifiers live on a stack of slots that
+# is shared by all of them and changed in place: a quantifier pushes one slot,
+# overwrites it for each element and pops it again, so binding a variable
+# costs O(1) and nothing is copied. Node.evaluate() resolves its formula
+# first, so bound variables are read from their slots by index; only free
+# variables are looked up here by name, on the stack (where a caller may
+# have pushed them) and then in a.
 class Allocation:
   def __init__(self, a):
     self.a = a
-  
+    self.names = []
+    self.values = []
+
+  def __getitem__(self, name):
+    names = self.names
+    for i in range(len(names) - 1, -1, -1):
+      if names[i] == name:
+        return self.values[i]
+    return self.a[name]
+
+  # Return an independent allocation with one more variable.
+  # Quantifiers no longer use this; it is kept for compatibility.
   def extend(self, name, value):
     x = copy(self.a)
+    x.update(zip(self.names, self.values))
     x[name] = value
     return Allocation(x)
 
 class Variable(Term):
-  def __init__(self, name):
-    self.name = name
-  def evaluate(self, structure, allocation):
-    return allocation.a[self.name]
-  def __str__(self):
-    return str(self.name)
+  __slots__ = ('name',)
+
+  def compute_free(self, sets):
+    return frozenset((self.name,))
+
+  def compute_vars(self, sets):
+    return frozenset((self.name,))
+
+  def _evaluate(self, structure, allocation):
+    return allocation[self.name]
+  def pieces(self):
+    return [self.name]
+
+# A variable occurrence that has been resolved to its quantifier.
+# The index counts the quantifiers between the occurrence and its own
+# (de Bruijn index), which is also its distance from the top of the slot
+# stack of the allocation during evaluation.
+class Bound(Term):
+  __slots__ = ('name', 'index')
+
+  def compute_free(self, sets):
+    return frozenset()
+
+  def compute_vars(self, sets):
+    return frozenset((self.name,))
+
+  def _evaluate(self, structure, allocation):
+    return allocation.values[-1 - self.index]
+  def pieces(self):
+    return [self.name]
+
+# Replace every bound variable of a formula with its Bound slot, so that
+# evaluation reads it from the allocation without searching by name.
+#
+# The tree is walked with an explicit stack. levels maps each variable name
+# to the nesting levels of the quantifiers currently binding it, and the
+# rebuilt children of each node are collected on out.
+def resolve(formula):
+  out, levels, depth = [], {}, 0
+  stack = [(formula, False)]
+  while stack:
+    x, done = stack.pop()
+    if done:
+      n = len(tuple(x.children()))
+      children = out[len(out)-n:]
+      del out[len(out)-n:]
+      out.append(x.rebuild(children))
+      if x.__class__ in (Exists, Forall):
+        levels[x.variable.name].pop()
+        depth -= 1
+    elif x.__class__ is Variable:
+      if levels.get(x.name):
+        out.append(Bound(x.name, depth - 1 - levels[x.name][-1]))
+      else:
+        out.append(x)
+    elif x.__class__ in (Exists, Forall):
+      # The quantified variable itself is kept; only its body is in scope.
+      out.append(x.variable)
+      levels.setdefault(x.variable.name, []).append(depth)
+      depth += 1
+      stack.append((x, True))
+      stack.append((x.formula, False))
+    else:
+      stack.append((x, True))
+      stack.extend((c, False) for c in reversed(tuple(x.children())))
+  return out[0]
@@ -3,43 +3,43 @@ import parser.symbol
 import parser.lexer
 
 class Symbol(parser.symbol.Term):
-    pass
+    __slots__ = ()
 
 class Equality(Symbol):
-    pass
+    __slots__ = ()
 
 class Relation(Symbol):
-    pass
+    __slots__ = ()
 
 class Function(Symbol):
-    pass
+    __slots__ = ()
 
 class Constant(Symbol):
-    pass
+    __slots__ = ()
 
 class Operator(parser.symbol.Term):
-    pass
+    __slots__ = ()
 
 class Quantor(Operator):
-    pass
+    __slots__ = ()
 
 class Junctor(Operator):
-    pass
+    __slots__ = ()
 
 class Not(Operator):
-    pass
+    __slots__ = ()
 
 class LeftParen(Operator):
-    pass
+    __slots__ = ()
 
 class RightParen(Operator):
-    pass
+    __slots__ = ()
 
 class Variable(parser.symbol.Term):
-    pass
+    __slots__ = ()
 
 class Comma(Operator):
-    pass
+    __slots__ = ()
 
 lexer = lambda signature: parser.lexer.lexer(
         meta = {
@@ -54,5 +54,5 @@ lexer = lambda signature: parser.lexer.lexer(
             [(name, sym) for name, sym in signature['constants'].items()]
         ),
         variable = Variable,
-        char_filter = lambda c: ('1' <= c <= '9' or 'a' <= c <= 'z' or 'A' <= c <= 'Z')
+        char_class = '[1-9a-zA-Z]'
     )
@@ -1,130 +1,195 @@
 # Christoph Burschka, 2012
 
+import re
+
 import core as FO
 import symbols as SYM
 
+# A single pattern for one pass over the input: whitespace, an ASCII (or TeX)
+# notation to be replaced with its Unicode symbol, a reserved symbol, or a
+# word up to the next whitespace, reserved symbol or replaceable notation.
+# Where notations overlap (such as '<->' and '->', or '\leftrightarrow' and
+# '\left'), the longest one is taken.
+replacements = dict(SYM.replace)
+notations = '|'.join(re.escape(x) for x in sorted(replacements, key=len, reverse=True))
+reserved = re.escape(''.join(sorted(SYM.reserved)))
+pattern = re.compile(r'\s+|({0})|([{1}])|((?:(?!{0})[^\s{1}])+)'.format(notations, reserved))
+
 # Create sequence of symbol tokens
 def lex(string):
-
-    # Replace ASCII strings with the Unicode symbols they represent.
-    for x,y in SYM.replace:
-        string = string.replace(x, y)
-
-    # Add space around reserved symbols to isolate them.
-    for character in SYM.reserved:
-        string = string.replace(character, ' ' + character + ' ')
+    tokens = []
+    for notation, symbol, word in pattern.findall(string):
+        if notation:
+            # Notations for layout (\left, \right) are dropped.
+            if replacements[notation]:
+                tokens.append(replacements[notation])
+        elif symbol or word:
+            tokens.append(symbol or word)
 
     # The input string must have spaces wherever two consecutive tokens are non-FO symbols.
     # This occurs only when a quantified expression starts with a signature symbol.
     # eg. "∀varvar=var" can mean "∀varva r=var" or "∀var var=var"
-    return string.split()
+    return tokens
 
 class parser:
     def __init__(self, signature, parens = True):
         self.signature = signature
         self.parens = parens
-        
-    # A recursive implementation of an LR-parser.
+
+    # The tokens are read from a single list, at the position self.i.
+    def next(self):
+        if self.i >= len(self.tokens):
+            raise ValueError("Unexpected end of formula.")
+        self.i += 1
+        return self.tokens[self.i - 1]
+
+    def peek(self):
+        if self.i >= len(self.tokens):
+            raise ValueError("Unexpected end of formula.")
+        return self.tokens[self.i]
+
+    # The kind of a signature symbol; constants may be given as 'constant'
+    # or as ('constant', 0).
+    def kind(self, token):
+        entry = self.signature[token]
+        return (entry, 0) if isinstance(entry, str) else entry
+
     # Parse tokens until a full formula is accepted, then return it along with the unparsed remainder.
-    # This allows the parser to recurse into a junction without knowing where to split.
-    # The FO grammar is non-ambiguous given a tokenized string and a predefined signature.
     def parse_formula(self, tokens):
-        # Read the first token: For anything but an equality, it can be a quantor, an open-paren, a negation or a rel symbol.
-        if tokens[0] in SYM.quantors:
-            # If it's a quantor, then the next token is a variable. Make sure it is not a reserved symbol.
-            quantor = SYM.quantors[tokens[0]]
-            if tokens[1] in SYM.reserved or tokens[1] in self.signature:
-                raise ValueError("Variable expected but '%s' is reserved symbol." % tokens[1])
-            var = FO.Variable(tokens[1])
-            
-            # Now parse the quantified formula.
-            form, remainder = self.parse_formula(tokens[2:])
-            return quantor(var, form), remainder
-    
-        elif tokens[0] == SYM.NOT:
-            # If it's a negation operator, then another formula follows.
-            form, remainder = self.parse_formula(tokens[1:])
-            return FO.Negation(form), remainder
-            
-        elif tokens[0] == '(':
-            # An opening parenthesis indicates a binary formula. Parse the left side...
-            form1, remainder = self.parse_formula(tokens[1:])
-            
-            # After parsing the left side, the remainder must start with a junctor.
-            if remainder[0] not in SYM.junctors:
-                raise ValueError("Junctor expected but '%s' is not one." % remainder[0])
-            operator = SYM.junctors[remainder[0]]
-            
-            # Then parse the right side.
-            form2, remainder = self.parse_formula(remainder[1:])
-            
-            # Ensure the parentheses are closed:
-            if remainder[0] != ')':
-                raise ValueError("Close-paren expected, but '%s' found." % remainder[0])
-            return operator(form1, form2),remainder[1:]
-            
-        elif tokens[0] in self.signature and self.signature[tokens[0]][0] == 'relation':
-            # A relation symbol is followed by a parenthesized list of terms, parsed by parse_terms().
-            # This function will ensure the list length matches the arity of the symbol.
-            terms, remainder = self.parse_terms(tokens[1:], self.signature[tokens[0]][1])
-            return FO.Relation(tokens[0], terms),remainder
-
-        # None of the above symbols matched the first token. It must be the first term of an equality formula.
-        term1, remainder = self.parse_term(tokens)
-        if remainder[0] != '=':
-            raise ValueError("Token '=' expected, but '%s' found." % remainder[0])
-        term2, remainder = self.parse_term(remainder[1:])
-        return FO.Equals(term1, term2),remainder
+        self.tokens, self.i = tokens, 0
+        formula = self.formula()
+        return formula, tokens[self.i:]
+
+    # An LL parser that reads the tokens from left to right in a single pass.
+    # Instead of recursing into subformulas, it keeps the connectives that are
+    # still waiting for their operands on a stack, so that neither the depth
+    # nor the length of a formula is limited.
+    # The FO grammar is non-ambiguous given a tokenized string and a predefined signature.
+    def formula(self):
+        stack = []
+        while True:
+            # Read the first token: For anything but an equality, it can be a quantor, an open-paren, a negation or a rel symbol.
+            token = self.next()
+            if token in SYM.quantors:
+                # If it's a quantor, then the next token is a variable. Make sure it is not a reserved symbol.
+                name = self.next()
+                if name in SYM.reserved or name in self.signature:
+                    raise ValueError("Variable expected but '%s' is reserved symbol." % name)
+                # The quantified formula follows.
+                stack.append((SYM.quantors[token], FO.Variable(name)))
+                continue
+            elif token == SYM.NOT:
+                # If it's a negation operator, then another formula follows.
+                stack.append((FO.Negation,))
+                continue
+            elif token == '(':
+                # An opening parenthesis indicates a binary formula, whose left side follows.
+                stack.append(('(',))
+                continue
+            elif token in self.signature and self.kind(token)[0] == 'relation':
+                # A relation symbol is followed by a parenthesized list of terms, parsed by parse_terms().
+                # This function will ensure the list length matches the arity of the symbol.
+                form = FO.Relation(token, self.parse_terms(self.kind(token)[1]))
+            else:
+                # None of the above symbols matched the first token. It must be the first term of an equality formula.
+                self.i -= 1
+                term1 = self.parse_term()
+                if self.peek() != '=':
+                    raise ValueError("Token '=' expected, but '%s' found." % self.peek())
+                self.i += 1
+                form = FO.Equals(term1, self.parse_term())
+
+            # A complete formula: apply the waiting connectives to it, until one
+            # of them needs another operand.
+            while stack:
+                top = stack.pop()
+                if top[0] == '(':
+                    # After parsing the left side, the remainder must start with a junctor.
+                    junctor = self.next()
+                    if junctor not in SYM.junctors:
+                        raise ValueError("Junctor expected but '%s' is not one." % junctor)
+                    # Then parse the right side.
+                    stack.append((')', SYM.junctors[junctor], form))
+                    break
+                elif top[0] == ')':
+                    # Ensure the parentheses are closed:
+                    end = self.next()
+                    if end != ')':
+                        raise ValueError("Close-paren expected, but '%s' found." % end)
+                    form = top[1](top[2], form)
+                else:
+                    form = top[0](*top[1:], form)
+            else:
+                return form
 
     # Parse a parenthesized, comma-separated list of terms of fixed non-zero length.
-    def parse_terms(self, tokens, arity):
-        # Ensure the list starts with an opening parenthesis.
+    def parse_terms(self, arity):
+        self.open()
+        terms = [self.parse_term()]
+        while len(terms) < arity:
+            self.separate(arity, len(terms))
+            terms.append(self.parse_term())
+        self.close(arity)
+        return terms
+
+    # Parse a term. Function symbols whose arguments are still being read wait on a stack.
+    def parse_term(self):
+        stack = []
+        while True:
+            token = self.next()
+            if token in self.signature:
+                t, r = self.kind(token)
+                if t == 'function':
+                    self.open()
+                    stack.append((token, r, []))
+                    continue
+                elif t == 'constant':
+                    term = FO.Constant(token)
+                else:
+                    # A non-function, non-constant symbol is a relation symbol, which is not allowed in a term.
+                    raise ValueError("Term expected, but relation symbol '%s' found." % token)
+            elif token in SYM.reserved:
+                raise ValueError("Variable expected, but reserved symbol '%s' found." % token)
+            else:
+                term = FO.Variable(token)
+
+            # Add the term to the innermost function; it is complete once it has all of its arguments.
+            while stack:
+                symbol, arity, terms = stack[-1]
+                terms.append(term)
+                if len(terms) < arity:
+                    self.separate(arity, len(terms))
+                    break
+                self.close(arity)
+                stack.pop()
+                term = FO.Function(symbol, terms)
+            else:
+                return term
+
+    # Ensure a list of terms starts with an opening parenthesis.
+    def open(self):
         if self.parens:
-            start, tokens = tokens[0],tokens[1:]
+            start = self.next()
             if start != '(':
-                raise ValueError("Open-paren expected, but '%s' found." % tokens[1])
-
-        # Parse the first term, allowing the loop to handle commas.
-        term, tokens = self.parse_term(tokens)
-        terms = [term]
-        
-        # Parse the remaining terms.
-        for i in range(1, arity):
-            # Check for the comma. If the list closes prematurely, explicitly state the arity mismatch.
-            if self.parens:
-                sep, tokens = tokens[0], tokens[1:]
-                if sep != ',':
-                    if sep == ')':
-                        raise ValueError("Arity violation: %d terms expected, but only %d found." % (arity, i+1))
-                    raise ValueError("Comma expected, but '%s' found." % sep)
-                term, tokens = self.parse_term(tokens)
-            terms.append(term)
-
-        # Check for a closing parenthesis. If a comma indicates the list goes on, state the arity mismatch.
+                raise ValueError("Open-paren expected, but '%s' found." % start)
+
+    # Check for the comma after i terms. If the list closes prematurely, explicitly state the arity mismatch.
+    def separate(self, arity, i):
         if self.parens:
-            end, tokens = tokens[0], tokens[1:]
+            sep = self.next()
+            if sep != ',':
+                if sep == ')':
+                    raise ValueError("Arity violation: %d terms expected, but only %d found." % (arity, i))
+                raise ValueError("Comma expected, but '%s' found." % sep)
+
+    # Check for a closing parenthesis. If a comma indicates the list goes on, state the arity mismatch.
+    def close(self, arity):
+        if self.parens:
+            end = self.next()
             if end != ')':
                 if end == ',':
                     raise ValueError("Arity violation: %d terms expected, but more found." % arity)
-            raise ValueError("Close-paren expected, but '%s' found." % end)
-        return terms, tokens
-
-    # Parse a term.
-    def parse_term(self, tokens):
-        if tokens[0] in self.signature:
-            t,r = self.signature[tokens[0]]
-            if t == 'function':
-                terms, remainder = self.parse_terms(tokens[1:], r)
-                return FO.Function(symbol, terms), remainder
-            elif t == 'constant':
-                return FO.Constant(symbol), tokens[1:]
-            else:
-                # A non-function, non-constant symbol is a relation symbol, which is not allowed in a term.
-                raise ValueError("Term expected, but relation symbol '%s' found." % symbol)
-        elif tokens[0] in SYM.reserved:
-            raise ValueError("Variable expected, but reserved symbol '%s' found." % tokens[0])
-        else:
-            return FO.Variable(tokens[0]), tokens[1:]
+                raise ValueError("Close-paren expected, but '%s' found." % end)
 
 def main(string, signature):
     tokens = lex(string)
@@ -1,5 +1,43 @@
+import hashlib
+import os
+import pickle
+
 from .symbol import Start, NonTerm, Term, End
 from . import pda
+from .pda import state_string, rule_string
+
+# Version des Cache-Formats; bei jeder Änderung der Tabellen erhöhen.
+CACHE_VERSION = 1
+
+# Ein Hash des Quelltexts, der die Tabellen konstruiert (dieses Modul und
+# pda). Er geht in den Schlüssel ein, so dass Tabellen, die eine andere
+# Version des Codes erzeugt hat, nicht geladen werden.
+def source_hash():
+    h = hashlib.sha256()
+    for path in (__file__, pda.__file__):
+        try:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+SOURCE_HASH = source_hash()
+
+# Verzeichnis für gespeicherte Parsertabellen: $PARSER_CACHE, sonst
+# ~/.cache/python-logic (bzw. $XDG_CACHE_HOME/python-logic).
+def cache_directory():
+    if 'PARSER_CACHE' in os.environ:
+        return os.environ['PARSER_CACHE']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'python-logic')
+
+# Lösche alle gespeicherten Tabellen.
+def clear_cache(directory=None):
+    directory = directory or cache_directory()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(directory, name))
 
 class grammar:
     # prods: Ein dictionary, das jedem Nichtterminal ein set aller Produktions-
@@ -30,6 +68,58 @@ class grammar:
         assert all(issubclass(s, Term) and s != End for s in self.terms), 'Ungültiges Terminalsymbol.'
 
 
+    # Ein stabiler Hash der Grammatik und der Konstruktion (z.B. 'slr1') samt
+    # ihres Codes: Symbole gehen mit Modul und Namen ihrer Klasse ein, und die
+    # Produktionen werden sortiert, so dass er nicht von der Reihenfolge der
+    # sets abhängt.
+    def key(self, construction):
+        prods = sorted(rule_key((l, p)) for (l, r) in self.prods.items() for p in r)
+        text = repr((CACHE_VERSION, SOURCE_HASH, construction, rule_key((self.start, ())), prods))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # Erzeuge den Automaten mit der angegebenen Konstruktion (einer Methode
+    # wie slr1), oder lade ihn aus dem Cache, falls er dort schon liegt.
+    # Mit rebuild=True wird er in jedem Fall neu erzeugt und gespeichert.
+    # Grammatiken, deren Symbole sich nicht pickeln lassen (z.B. lokal
+    # definierte Klassen), werden nicht gespeichert.
+    def cached(self, construction='slr1', directory=None, rebuild=False):
+        path = self.cache_path(construction, directory)
+        if not rebuild:
+            try:
+                with open(path, 'rb') as f:
+                    version, tables = pickle.load(f)
+                if version == CACHE_VERSION:
+                    return pda.lr1.from_tables(**tables)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError):
+                pass
+
+        automaton = getattr(self, construction)()
+        try:
+            data = pickle.dumps((CACHE_VERSION, automaton.tables()))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return automaton
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Erst vollständig schreiben, dann umbenennen, damit parallele
+            # Prozesse nie eine halbe Datei lesen.
+            temp = '{0}.{1}.tmp'.format(path, os.getpid())
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            pass
+        return automaton
+
+    # Entferne die gespeicherten Tabellen dieser Grammatik.
+    def invalidate(self, construction='slr1', directory=None):
+        try:
+            os.remove(self.cache_path(construction, directory))
+        except FileNotFoundError:
+            pass
+
+    def cache_path(self, construction, directory=None):
+        return os.path.join(directory or cache_directory(), self.key(construction) + '.pickle')
+
     def __str__(self):
         return 'Start: {0}\nTerminale: {1}\nNichtterminale: {2}\nProduktionen:\n{3}'.format(
             self.start.__name__,
@@ -45,132 +135,353 @@ class grammar:
 # Ein Simple LR(1) Parser:
 # - 1 Symbol als Lookahead
 # - die Follow-Sets werden pro Symbol (nicht pro Zustand/Symbol) berechnet.
+#
+# Die Konstruktion arbeitet mit Worklisten statt Rekursion und Fixpunkt-
+# Iteration über alle Produktionen: Jede Produktion (links, rechts) hat eine
+# Nummer, und jedes Item (Produktion, Punkt) ist eine ganze Zahl, nämlich
+# offset[Produktion] + Punkt.
 class slr1_grammar(grammar):
     def slr1(self):
-        # Beginne mit einer Startproduktion S' -> S $
-        start = self.close_state({(Start, (self.start, End), 0)})
-
-        # Berechne rekursiv die Folgezustände.
+        self.index_items()
         nullable = self.nullable()
         first = self.first(nullable)
         follow = self.follow(nullable, first)
-        states, shift, reduce = self.derive_states(start, follow, {start})
+        states, goto = self.derive_states()
+
+        # Reduziere bei jedem Symbol, das der linken Seite folgen kann.
+        def reductions(state):
+            for i in states[state]:
+                if self.item_symbol[i] is None:
+                    rule = self.productions[self.item_production[i]]
+                    yield rule, follow[rule[0]]
+        return self.automaton(states, goto, reductions)
+
+    # Numeriere Produktionen und Items und lege die Indizes an:
+    # - productions[p] = (links, rechts), mit der Startproduktion S' -> S $ als 0,
+    # - by_left[N] = Nummern der Produktionen von N,
+    # - item_symbol[i] = das nach dem Punkt zu lesende Symbol (None am Ende),
+    # - item_production[i] = die Produktion des Items.
+    def index_items(self):
+        self.productions = [(Start, (self.start, End))]
+        self.productions += sorted(((l, r) for (l, alts) in self.prods.items() for r in alts), key=rule_key)
+        self.by_left = {n: [] for n in self.nonterms}
+        self.offset = []
+        self.item_symbol, self.item_production = [], []
+        for p, (left, right) in enumerate(self.productions):
+            if left is not Start:
+                self.by_left[left].append(p)
+            self.offset.append(len(self.item_symbol))
+            self.item_symbol.extend(right)
+            self.item_symbol.append(None)
+            self.item_production.extend([p] * (len(right) + 1))
 
-        return pda.lr1(self.terms, self.nonterms, start, states, shift, reduce)
+        # Der Abschluss der Anfangsitems jedes Nichtterminals, einmal berechnet.
+        self.closures = {}
+        for n in self.nonterms:
+            items, seen, work = set(), {n}, [n]
+            while work:
+                for p in self.by_left[work.pop()]:
+                    items.add(self.offset[p])
+                    symbol = self.item_symbol[self.offset[p]]
+                    if symbol in self.nonterms and symbol not in seen:
+                        seen.add(symbol)
+                        work.append(symbol)
+            self.closures[n] = frozenset(items)
 
     # Ein Zustand ist abgeschlossen, wenn für jedes zu lesende
     # Nichtterminal auch jede Produktion enthalten ist.
-    def close_state(self, state):
-        # Wiederhole, bis keine neuen Produktionen eingefügt werden.
-        old, new = 0, len(state)
-        while old < new:
-            # Welche Nichtterminale können gelesen werden?
-            nonterm_shifts = {right[dot] for (left, right, dot) in state if dot < len(right) and right[dot] in self.nonterms}
-            # Füge alle deren Produktionen hinzu.
-            for left in nonterm_shifts:
-                state.update((left, right, 0) for right in self.prods[left])
-            old, new = new, len(state)
-
-        # frozenset() ist immutable, und darf daher selbst Element eines sets sein.
-        return frozenset(state)
-
-    # Die Zustandsmenge ist abgeschlossen, wenn sie für jeden Zustand und jedes lesbare Zeichen
-    # auch den abgeschlossenen Folgezustand enthält.
-    def derive_states(self, state, follow, states, shift=None, reduce=None):
-        # Initialisiere die shift/reduce Tabellen:
-        if shift == reduce == None:
-            shift, reduce = {}, {}
-
-        # Berechne die Reduktionsregeln.
-        for left, right, dot in state:
-            if dot == len(right):
-                add_reduce = {(state, lookahead) : (left, right) for lookahead in follow[left]}
-                for state, symbol in set(reduce.keys()).intersection(add_reduce.keys()):
-                    raise ValueError('Reduce / Reduce-Konflikt.\nZustand: {0}\nLookahead: {1}\nReduktion 1: {2}\nReduktion 2: {3}'.format(
-                        state_string(state), symbol.__name__, rule_string(reduce[(state, symbol)]), rule_string(add_reduce[(state, symbol)])
-                    ))
-                reduce.update(add_reduce)
-
-        # Berechne die Shiftregeln.
-        added = set()
-        for symbol in {right[dot] for (left, right, dot) in state if dot < len(right)}:
-            # Füge den erreichten Zustand hinzu:
-            next = self.close_state({(left, right, dot+1) for (left, right, dot) in state if dot < len(right) and right[dot] == symbol})
+    def close_state(self, kernel):
+        state = set(kernel)
+        for i in kernel:
+            symbol = self.item_symbol[i]
+            if symbol in self.nonterms:
+                state |= self.closures[symbol]
+        return state
+
+    # Berechne die LR(0)-Zustände als Worklist über ihre Kerne: Für jeden
+    # Zustand werden die Items nach dem nächsten Symbol sortiert; jeder solche
+    # Eimer ergibt den Kern eines Folgezustands. Zustände werden über ihren
+    # Kern identifiziert und in der Reihenfolge ihres Auftretens numeriert.
+    # Ergebnis: die abgeschlossenen Zustände als sortierte Item-Listen, und
+    # die Übergänge goto[(Zustand, Symbol)] = Folgezustand.
+    def derive_states(self):
+        start = frozenset({self.offset[0]})
+        kernels, numbering = [start], {start: 0}
+        states, goto = [], {}
+
+        for state, kernel in enumerate(kernels):
+            items = sorted(self.close_state(kernel))
+            states.append(items)
+            buckets = {}
+            for i in items:
+                if self.item_symbol[i] is not None:
+                    buckets.setdefault(self.item_symbol[i], []).append(i + 1)
+            for symbol, bucket in buckets.items():
+                next = frozenset(bucket)
+                if next not in numbering:
+                    numbering[next] = len(kernels)
+                    kernels.append(next)
+                goto[(state, symbol)] = numbering[next]
+
+        return states, goto
+
+    # Erzeuge die Tabellen aus den Zuständen (Item-Listen), den Übergängen und
+    # den Reduktionen, die reductions(Zustand) als Paare (Regel, Lookaheads)
+    # liefert. Alle Konstruktionen melden Konflikte hier, auf dieselbe Weise.
+    def automaton(self, states, goto, reductions):
+        shift, reduce = {}, {}
+        for state in range(len(states)):
+            for rule, lookaheads in reductions(state):
+                for lookahead in lookaheads:
+                    if (state, lookahead) in reduce and reduce[(state, lookahead)] != rule:
+                        raise ValueError('Reduce / Reduce-Konflikt.\nZustand: {0}\nLookahead: {1}\nReduktion 1: {2}\nReduktion 2: {3}'.format(
+                            state_string(self.items(states[state])), lookahead.__name__, rule_string(reduce[(state, lookahead)]), rule_string(rule)
+                        ))
+                    reduce[(state, lookahead)] = rule
+
+        for (state, symbol), next in goto.items():
             if (state, symbol) in reduce:
                 raise ValueError('Shift / Reduce-Konflikt.\nZustand: {0}\nLookahead: {1}\nShift: {2}\nReduktion: {3}'.format(
-                    state, symbol, next, reduce[(state, symbol)]
+                    state_string(self.items(states[state])), symbol.__name__, state_string(self.items(states[next])), rule_string(reduce[(state, symbol)])
                 ))
             shift[(state, symbol)] = next
-            if next not in states:
-                added.add(next)
-        states |= added
 
-        # Rekursion für jeden neuen Zustand.
-        for state in added:
-            self.derive_states(state, follow, states, shift, reduce)
+        return pda.lr1.from_tables(self.terms, self.nonterms, len(states), shift, reduce)
 
-        return states, shift, reduce
+    # Die Items eines Zustands als Tupel (links, rechts, Punkt).
+    def items(self, state):
+        return [self.productions[self.item_production[i]] + (i - self.offset[self.item_production[i]],) for i in state]
 
-    # Bestimme die auf Null produzierenden Nichtterminale
+    # Bestimme die auf Null produzierenden Nichtterminale: Jede Alternative
+    # zählt ihre noch nicht als nullbar bekannten Symbole herunter.
     def nullable(self):
-        # Fixpunkt-Iteration
-        nullable = {None}
-        old, new = 0, 1
-        while old < new:
-            for left, right in self.prods.items():
-                # Falls alle Symbole einer Alternative auf Null produzieren:
-                if any(all(t in nullable for t in alt) for alt in right):
+        remaining = {}
+        occurrences = {}
+        nullable, work = set(), []
+        for left, right in self.prods.items():
+            for alt in right:
+                remaining[left, alt] = len(alt)
+                for t in alt:
+                    occurrences.setdefault(t, []).append((left, alt))
+                if not alt and left not in nullable:
                     nullable.add(left)
-            old, new = new, len(nullable)
-        return nullable.difference([None])
+                    work.append(left)
+        while work:
+            for left, alt in occurrences.get(work.pop(), ()):
+                remaining[left, alt] -= 1
+                if remaining[left, alt] == 0 and left not in nullable:
+                    nullable.add(left)
+                    work.append(left)
+        return nullable
 
-    # Bestimme die ersten Terminale, auf die jedes Nichtterminal produzieren kann.
+    # Bestimme die ersten Terminale, auf die jedes Nichtterminal produzieren kann:
+    # first[X] fließt in first[N] für jedes X, das in einer Alternative von N
+    # nach einem nullbaren Präfix steht.
     def first(self, nullable):
         first = dict([(n,set()) for n in self.nonterms] + [(t,{t}) for t in self.terms] + [(Start, {self.start})])
-
-        # Fixpunkt-Iteration
-        old, new = 0, len(self.terms)
-        while old < new:
-            for left, right in self.prods.items():
-                for alt in right:
-                    for t in alt:
-                        first[left].update(first[t])
-                        if t not in nullable:
-                            break
-            old, new = new, sum(len(x) for x in first.values())
+        into = {}
+        for left, right in self.prods.items():
+            for alt in right:
+                for t in alt:
+                    into.setdefault(t, set()).add(left)
+                    if t not in nullable:
+                        break
+        propagate(first, into, list(self.terms))
         return first
 
     # Bestimme alle Lookahead-Symbole für die Reduktion eines Nichtterminals:
+    # direkt folgende Terminale, und follow[links] für jedes Nichtterminal am
+    # (bis auf nullbare Symbole) Ende einer Alternative.
     def follow(self, nullable, first):
-        direct = {n:set() for n in self.nonterms}
-        parents = {n:set() for n in self.nonterms}
-
-        parents[Start] = set()
-        direct[Start], direct[self.start] = set(), {End}
-
-        for symbol in self.nonterms:
-            # Finde alle Stellen, wo das Symbol rechts in einer Produktion steht:
-            for left, right in self.prods.items():
-                for alt in right:
-                    for i, t in enumerate(alt):
-                        if symbol == t:
-                            # Bestimme alle ersten Terminalsymbole der Folgekette:
-                            for f in alt[i+1:]:
-                                direct[symbol] |= first[f]
-                                if f not in nullable:
-                                    break
-                            else:
-                                # Wenn die Kette auf das leere Wort produzieren kann, so folge der linken Seite.
-                                parents[symbol].add(left)
-
-        # Berechne transitiven Abschluss von parents:
-        old, new = 0, sum(len(p) for p in parents.values())
-        while old < new:
-            for s, p in parents.items():
-                parents[s].update(*(parents[x] for x in p))
-            old, new = new, sum(len(p) for p in parents.values())
-
-        # Berechne daraus die Follow-Sets:
-        follow = {symbol:direct[symbol].union(*(direct[p] for p in parents[symbol])) for symbol in direct}
+        follow = {n:set() for n in self.nonterms}
+        follow[Start], follow[self.start] = set(), {End}
+        into = {}
+
+        for left, right in self.prods.items():
+            for alt in right:
+                # Laufe von hinten, und merke die ersten Terminale des Rests.
+                rest, tail = set(), True
+                for t in reversed(alt):
+                    if t in self.nonterms:
+                        follow[t] |= rest
+                        if tail:
+                            into.setdefault(left, set()).add(t)
+                    if t in nullable:
+                        rest = rest | first[t]
+                    else:
+                        rest, tail = set(first[t]), False
+
+        propagate(follow, into, list(follow))
         return follow
 
+# Ein LALR(1) Parser: die Zustände des SLR-Parsers, aber mit Lookaheads pro
+# Zustand und Reduktion, berechnet nach DeRemer und Pennello ("Efficient
+# Computation of LALR(1) Look-Ahead Sets", 1982) über die Übergänge auf
+# Nichtterminalen.
+class lalr1_grammar(slr1_grammar):
+    def lalr1(self):
+        self.index_items()
+        nullable = self.nullable()
+        states, goto = self.derive_states()
+        lookaheads = self.lookaheads(states, goto, nullable)
+
+        def reductions(state):
+            for i in states[state]:
+                if self.item_symbol[i] is None:
+                    p = self.item_production[i]
+                    yield self.productions[p], lookaheads.get((state, p), ())
+        return self.automaton(states, goto, reductions)
+
+    # Bestimme LA(Zustand, Produktion) für alle Reduktionen.
+    def lookaheads(self, states, goto, nullable):
+        out = {}
+        for (state, symbol) in goto:
+            out.setdefault(state, []).append(symbol)
+        transitions = [(p, A) for (p, A) in goto if A in self.nonterms]
+
+        # DR(p, A): die Terminale, die nach dem Übergang direkt gelesen werden.
+        # (p, A) reads (r, C), wenn r = goto(p, A) und C nullbar ist.
+        direct, reads = {}, {}
+        for p, A in transitions:
+            r = goto[(p, A)]
+            direct[(p, A)] = {t for t in out.get(r, ()) if t not in self.nonterms}
+            reads[(p, A)] = [(r, C) for C in out.get(r, ()) if C in nullable]
+        read = digraph(transitions, reads, direct)
+
+        # (r, A) includes (p, B), wenn B → β A γ, γ nullbar und p --β--> r.
+        # (q, B → ω) lookback (p, B), wenn p --ω--> q.
+        includes, lookback = {}, {}
+        for p, B in transitions:
+            for production in self.by_left[B]:
+                right = self.productions[production][1]
+                tail = [True] * (len(right) + 1)
+                for k in range(len(right) - 1, -1, -1):
+                    tail[k] = tail[k+1] and right[k] in nullable
+                r = p
+                for k, X in enumerate(right):
+                    if X in self.nonterms and tail[k+1]:
+                        includes.setdefault((r, X), []).append((p, B))
+                    r = goto[(r, X)]
+                lookback.setdefault((r, production), []).append((p, B))
+        follow = digraph(transitions, includes, read)
+
+        return {reduction: set().union(*(follow[x] for x in sources)) for reduction, sources in lookback.items()}
+
+# Ein kanonischer LR(1) Parser: Die Items tragen ein Lookahead-Symbol, und
+# Zustände mit gleichen LR(0)-Items, aber verschiedenen Lookaheads bleiben
+# getrennt. Das ergibt die meisten Zustände, aber keine unnötigen Konflikte.
+class lr1_grammar(slr1_grammar):
+    def lr1(self):
+        self.index_items()
+        nullable = self.nullable()
+        first = self.first(nullable)
+        rest = {}
+
+        # Die ersten Terminale nach dem Punkt des Items i (bis zum Ende der
+        # Produktion), und ob der Rest nullbar ist.
+        def after(i):
+            if i not in rest:
+                terms, j = set(), i
+                while self.item_symbol[j] is not None and self.item_symbol[j] in nullable:
+                    terms |= first[self.item_symbol[j]]
+                    j += 1
+                if self.item_symbol[j] is None:
+                    rest[i] = terms, True
+                else:
+                    rest[i] = terms | first.get(self.item_symbol[j], {self.item_symbol[j]}), False
+            return rest[i]
+
+        # Ein LR(1)-Item ist ein Paar (Item, Lookahead); die Startproduktion
+        # wird nie reduziert und braucht keines.
+        start = frozenset({(self.offset[0], None)})
+        kernels, numbering = [start], {start: 0}
+        states, goto, reduce = [], {}, []
+
+        for state, kernel in enumerate(kernels):
+            items, work = set(kernel), list(kernel)
+            while work:
+                i, a = work.pop()
+                symbol = self.item_symbol[i]
+                if symbol in self.nonterms:
+                    terms, nullable_rest = after(i + 1)
+                    if nullable_rest:
+                        terms = terms | {a}
+                    for p in self.by_left[symbol]:
+                        for b in terms:
+                            if (self.offset[p], b) not in items:
+                                items.add((self.offset[p], b))
+                                work.append((self.offset[p], b))
+
+            states.append(sorted({i for (i, a) in items}))
+            buckets, reductions = {}, {}
+            for i, a in sorted(items, key=lambda x: x[0]):
+                symbol = self.item_symbol[i]
+                if symbol is None:
+                    if self.item_production[i]:
+                        reductions.setdefault(self.item_production[i], set()).add(a)
+                else:
+                    buckets.setdefault(symbol, set()).add((i + 1, a))
+            reduce.append([(self.productions[p], lookaheads) for (p, lookaheads) in reductions.items()])
+            for symbol, bucket in buckets.items():
+                next = frozenset(bucket)
+                if next not in numbering:
+                    numbering[next] = len(kernels)
+                    kernels.append(next)
+                goto[(state, symbol)] = numbering[next]
+
+        return self.automaton(states, goto, lambda state: reduce[state])
+
+# Die Funktion digraph von DeRemer und Pennello: Berechne für jeden Knoten x
+# F(x) = initial[x] ∪ ⋃{F(y) | x R y}, wobei edges[x] die y mit x R y sind.
+# Jede starke Zusammenhangskomponente bekommt dabei dieselbe Menge. Wie
+# Tarjans Algorithmus, aber mit explizitem Stack statt Rekursion.
+def digraph(nodes, edges, initial):
+    infinity = float('inf')
+    depth, result, stack = {}, {}, []
+    for root in nodes:
+        if root in depth:
+            continue
+        stack.append(root)
+        depth[root] = len(stack)
+        result[root] = set(initial[root])
+        work = [(root, len(stack), iter(edges.get(root, ())))]
+        while work:
+            x, d, successors = work[-1]
+            for y in successors:
+                if y not in depth:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    result[y] = set(initial[y])
+                    work.append((y, len(stack), iter(edges.get(y, ()))))
+                    break
+                depth[x] = min(depth[x], depth[y])
+                result[x] |= result[y]
+            else:
+                work.pop()
+                if depth[x] == d:
+                    while True:
+                        y = stack.pop()
+                        depth[y] = infinity
+                        result[y] = result[x]
+                        if y == x:
+                            break
+                if work:
+                    parent = work[-1][0]
+                    depth[parent] = min(depth[parent], depth[x])
+                    result[parent] |= result[x]
+    return result
+
+# Vereinige sets[x] in sets[y] für alle y in into[x], bis sich nichts mehr ändert.
+def propagate(sets, into, work):
+    while work:
+        x = work.pop()
+        for y in into.get(x, ()):
+            if not sets[x] <= sets[y]:
+                sets[y] |= sets[x]
+                work.append(y)
+
+# Sortierschlüssel für Produktionen aus Modul und Namen der Symbolklassen,
+# damit Numerierung und Hash nicht von der Reihenfolge der sets abhängen.
+def rule_key(rule):
+    name = lambda x: '{0}.{1}'.format(x.__module__, x.__qualname__)
+    return name(rule[0]), tuple(name(x) for x in rule[1])
@@ -1,3 +1,6 @@
+from array import array
+import itertools
+import re
 import string
 
 # The Lexer recognizes three types of symbols:
@@ -28,51 +31,185 @@ import string
 # (ie. either non-meta and non-whitespace, or escaped with \).
 # All names must consist of accepted characters.
 #
+# char_class may be passed instead, as a regular expression character class
+# (such as '[a-z]') of the accepted literal characters. It is compiled into
+# the master expression together with the meta-characters and whitespace, so
+# that literal characters need not be checked one by one.
+#
+# tokens() reads the input lazily from a string, a file object or any iterable
+# of strings, and yields the tokens as they are found; lex() returns the list.
+# compact() returns them as a token_array instead, which stores only the
+# class and value of each token.
+#
 class lexer:
-    def __init__(self, meta, names, variable, char_filter=None):
-        print(char_filter)
+    # Characters read at a time from a file object.
+    chunksize = 1 << 16
+
+    def __init__(self, meta, names, variable, char_filter=None, char_class=None):
         assert '\\' not in meta, '\\ is not an allowed meta character.'
         assert not char_filter or all(all(map(char_filter, name)) for name in names), 'A name contains an unacceptable character.'
+        assert not char_class or all(re.fullmatch(char_class + '+', name) for name in names), 'A name contains an unacceptable character.'
         self.meta = meta
         self.names = names
         self.variable = variable
         self.filter = char_filter
 
-    def lex(self, s, debug=False):
-        tokens = []
-        term = ''
-        escape = False
-
-        # Terminate the string with a whitespace character.
-        s += ' '
-
-        for i, c in enumerate(s):
-            # Find an unescaped backslash; skip and switch to escape mode:
-            if not escape and c == '\\':
-                escape = True
-
-            # Find an unescaped meta-character.
-            elif not escape and (c in self.meta or c in string.whitespace):
-                # Terminate the current buffer.
-                if term:
-                    tokens.append(self.names[term](term) if term in self.names else self.variable(term))
-                    term = ''
-                # Append the meta symbol.
-                if c in self.meta:
-                    tokens.append(self.meta[c](c))
-
-            # Finding an allowed literal character:
-            elif not self.filter or self.filter(c):
-                escape = False
-                # Add it to the term buffer:
-                term += c
-            else:
-                raise LexError(i, c)
+        # After any whitespace: a meta-character, a term of literal characters
+        # (accepted by char_class, or escaped and then also accepted), the end
+        # of the input, or else an unexpected character.
+        space = re.escape(string.whitespace)
+        separators = re.escape(''.join(meta)) + space
+        literal = char_class or '[^{0}\\\\]'.format(separators)
+        escaped = char_class or '.'
+        self.pattern = re.compile('[{0}]*(?:(?P<meta>{1})|(?P<term>(?:{2}|\\\\{3})+)|\\Z|(?P<bad>.))'.format(
+            space, '[{0}]'.format(re.escape(''.join(meta))) if meta else '(?!)', literal, escaped), re.DOTALL)
+        self.separators = list(meta) + list(string.whitespace)
 
+    def lex(self, s, debug=False, stats=None):
+        tokens = list(self.tokens(s, stats))
         if debug:
             print([str(t) for t in tokens])
         return tokens
 
+    # With a parser.stats.statistics object as stats, the tokens and the time
+    # spent producing them are counted.
+    def tokens(self, source, stats=None):
+        if stats is not None:
+            return stats.lexed(self.scan(source))
+        return (cls(value) for cls, value in self.scan(source))
+
+    def compact(self, source):
+        tokens = token_array()
+        tokens.extend(self.scan(source))
+        return tokens
+
+    # Yield the class and value of each token.
+    def scan(self, source):
+        if isinstance(source, str):
+            chunks = (source,)
+        elif hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(self.chunksize), '')
+        else:
+            chunks = source
+        meta, names, variable, filter = self.meta, self.names, self.variable, self.filter
+        findall = self.pattern.findall
+
+        # buffer holds the input from position offset on that is not yet
+        # tokenized. Only its part up to the last unescaped meta-character or
+        # whitespace is complete; the rest may continue in the next chunk.
+        buffer, offset = '', 0
+        for chunk in itertools.chain(chunks, (None,)):
+            if chunk is None:
+                cut = len(buffer)
+            else:
+                buffer += chunk
+                cut = self.boundary(buffer)
+            for c, term, bad in findall(buffer, 0, cut):
+                if c:
+                    yield meta[c], c
+                elif term:
+                    if '\\' in term:
+                        term = re.sub(r'\\(.)', r'\1', term, flags=re.DOTALL)
+                    if filter and not all(map(filter, term)):
+                        self.error(buffer[:cut], offset)
+                    yield names.get(term, variable), term
+                elif bad:
+                    self.error(buffer[:cut], offset)
+            buffer, offset = buffer[cut:], offset + cut
+
+    # The position after the last meta-character or whitespace in buffer that
+    # is not escaped (preceded by an odd number of backslashes), or 0.
+    def boundary(self, buffer):
+        end = len(buffer)
+        while True:
+            p = max(buffer.rfind(c, 0, end) for c in self.separators)
+            if p < 0:
+                return 0
+            k = p
+            while k and buffer[k-1] == '\\':
+                k -= 1
+            if (p - k) % 2 == 0:
+                return p + 1
+            end = p
+
+    # Find the first error in text (which begins at position offset) and raise
+    # it: an unexpected character, or one that char_filter does not accept. An
+    # escaped character is reported instead of its backslash, and a space
+    # after a backslash at the end of the input.
+    def error(self, text, offset):
+        for m in self.pattern.finditer(text):
+            if m.lastgroup == 'bad':
+                pos = m.start('bad')
+                if text[pos] == '\\':
+                    pos += 1
+                raise LexError(offset + pos, text[pos] if pos < len(text) else ' ')
+            elif m.lastgroup == 'term' and self.filter:
+                escape = False
+                for i, c in enumerate(m.group('term')):
+                    if not escape and c == '\\':
+                        escape = True
+                    elif not self.filter(c):
+                        raise LexError(offset + m.start('term') + i, c)
+                    else:
+                        escape = False
+
+# A sequence of tokens in parallel arrays: the index of each token's class in
+# classes, and the index of its value in values, where every distinct class
+# and value is stored once. The Term objects are only created when they are
+# accessed, so that a long input takes a few bytes per token until it is
+# parsed (for example by passing the token_array to lr1.parse).
+class token_array:
+    def __init__(self):
+        self.classes, self.values = [], []
+        self.class_ids, self.value_ids = {}, {}
+        self.kinds, self.offsets = array('B'), array('I')
+
+    def append(self, cls, value):
+        self.extend(((cls, value),))
+
+    def extend(self, pairs):
+        class_ids, value_ids = self.class_ids, self.value_ids
+        kinds, offsets = [], []
+        for cls, value in pairs:
+            k = class_ids.get(cls)
+            if k is None:
+                k = class_ids[cls] = len(self.classes)
+                self.classes.append(cls)
+            v = value_ids.get(value)
+            if v is None:
+                v = value_ids[value] = len(self.values)
+                self.values.append(value)
+            kinds.append(k)
+            offsets.append(v)
+            # Move the ids into the arrays from time to time, and switch to a
+            # larger item type when they no longer fit.
+            if len(kinds) >= 4096:
+                self.store(kinds, offsets)
+                kinds, offsets = [], []
+        self.store(kinds, offsets)
+
+    def store(self, kinds, offsets):
+        if len(self.classes) > 256 and self.kinds.typecode == 'B':
+            self.kinds = array('H', self.kinds)
+        self.kinds.extend(kinds)
+        self.offsets.extend(offsets)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.classes[self.kinds[i]](self.values[self.offsets[i]])
+
+    def __iter__(self):
+        classes, values = self.classes, self.values
+        for k, v in zip(self.kinds, self.offsets):
+            yield classes[k](values[v])
+
+    def memory(self):
+        return self.kinds.itemsize * len(self.kinds) + self.offsets.itemsize * len(self.offsets)
+
 class LexError(ValueError):
     def __init__(self, i, c):
         self.i, self.c = i, c
@@ -1,3 +1,8 @@
+from array import array
+import itertools
+import sys
+import time
+
 from .symbol import End
 
 class ParseError(ValueError):
@@ -15,6 +20,7 @@ class lr1:
         self.shift = shift
         self.reduce = reduce
         self.normalize_states()
+        self.build_arrays()
 
     # Benenne die Zustände mit Zahlen um.
     def normalize_states(self):
@@ -29,12 +35,178 @@ class lr1:
         self.states = list(range(len(self.states)))
         self.reduce = {(numbering[state], s): rule for ((state, s), rule) in self.reduce.items()}
 
+    # Die normalisierten Tabellen, aus denen from_tables() den Automaten
+    # wiederherstellt (z.B. für den Cache in cfg).
+    def tables(self):
+        return {'terms': self.terms, 'nonterms': self.nonterms, 'states': len(self.states), 'shift': self.shift, 'reduce': self.reduce}
+
+    # Erzeuge einen Automaten aus bereits normalisierten Tabellen;
+    # der Startzustand ist 0.
+    @classmethod
+    def from_tables(cls, terms, nonterms, states, shift, reduce):
+        self = cls.__new__(cls)
+        self.terms, self.nonterms = terms, nonterms
+        self.start = 0
+        self.states = list(range(states))
+        self.shift, self.reduce = shift, reduce
+        self.build_arrays()
+        return self
+
+    # Lege die Tabellen zusätzlich als dichte Arrays an, für parse():
+    # - ids bildet jede Terminalklasse (und End) auf eine kleine Zahl ab,
+    #   nonterm_ids jede Nichtterminalklasse; unbekannte Klassen bekommen die
+    #   letzte Spalte, in der nur Fehler stehen,
+    # - action[Zustand * width + Terminal] ist 0 (Fehler), s + 1 (Shift nach s)
+    #   oder -(r + 1) (Reduktion nach Regel r),
+    # - goto[Zustand * len(nonterm_ids) + Nichtterminal] ist der Folgezustand,
+    # - rules[r] = (links, rechts) mit rule_length[r] und rule_left[r] (die Id
+    #   der linken Seite).
+    # - nodes[r] erzeugt bei der Reduktion nach Regel r den Knoten des
+    #   Ableitungsbaums, actions[r] stattdessen den Wert der semantischen
+    #   Aktion; None bedeutet, dass das Symbol auf dem Stack bleibt.
+    def build_arrays(self):
+        namesort = lambda x: (x.__module__, x.__qualname__)
+        terms = [End] + sorted(set(self.terms) - {End}, key=namesort)
+        nonterms = sorted(set(self.nonterms) | {left for (left, right) in self.reduce.values()}, key=namesort)
+        self.ids = {t: i for (i, t) in enumerate(terms)}
+        self.nonterm_ids = {n: i for (i, n) in enumerate(nonterms)}
+        self.width = width = len(terms) + 1
+        self.rules = sorted(set(self.reduce.values()), key=lambda rule: (namesort(rule[0]), [namesort(x) for x in rule[1]]))
+        numbering = {rule: r for (r, rule) in enumerate(self.rules)}
+        self.rule_length = [len(right) for (left, right) in self.rules]
+        self.rule_left = [self.nonterm_ids[left] for (left, right) in self.rules]
+        self.nodes = [left for (left, right) in self.rules]
+        self.actions = [left.action or (None if len(right) == 1 else left) for (left, right) in self.rules]
+
+        states = len(self.states)
+        action = [0] * (states * width)
+        goto = [0] * (states * len(nonterms))
+        for (state, symbol), next in self.shift.items():
+            if symbol in self.nonterm_ids:
+                goto[state * len(nonterms) + self.nonterm_ids[symbol]] = next
+            else:
+                action[state * width + self.ids[symbol]] = next + 1
+        for (state, symbol), rule in self.reduce.items():
+            action[state * width + self.ids[symbol]] = -(numbering[rule] + 1)
+        self.action = array(typecode(min(action, default=0), max(action, default=0)), action)
+        self.goto = array(typecode(0, max(goto, default=0)), goto)
 
+    # Speicherbedarf der Tabellen in Bytes (für die dicts ohne Schlüssel und Werte).
+    def memory(self):
+        return {
+            'shift': sys.getsizeof(self.shift),
+            'reduce': sys.getsizeof(self.reduce),
+            'action': self.action.itemsize * len(self.action),
+            'goto': self.goto.itemsize * len(self.goto),
+        }
+
+    # Lese eine Symbolkette: Pro Schritt ein Zugriff auf action, und bei
+    # einer Reduktion einer auf goto.
+    #
+    # Mit actions=True wird kein Ableitungsbaum aufgebaut, sondern bei jeder
+    # Reduktion die semantische Aktion der linken Seite ausgeführt (siehe
+    # symbol.NonTerm.action); Reduktionen nach Produktionen der Länge 1 ohne
+    # Aktion entfallen, und das Ergebnis ist der Wert des Startsymbols.
+    #
+    # Mit einem stats.statistics-Objekt als stats werden die Schritte gezählt.
+    def parse(self, string, verbose=False, actions=False, stats=None):
+        if verbose:
+            return self.parse_verbose(string)
+        if stats is not None:
+            return self.parse_counted(string, actions, stats)
+        ids, action, goto, width = self.ids, self.action, self.goto, self.width
+        unknown = width - 1
+        reducers = self.actions if actions else self.nodes
+        rule_length, rule_left = self.rule_length, self.rule_left
+        height = len(self.nonterm_ids)
+
+        # Zustand-Stack, Symbol-Stack
+        states = [self.start]
+        symbols = []
+        state = self.start
 
-    # Lese eine Symbolkette
-    def parse(self, string, verbose=False):
+        for i, token in enumerate(itertools.chain(string, (End(),))):
+            symbol = ids.get(type(token), unknown)
+            while True:
+                a = action[state * width + symbol]
+                # Shift:
+                if a > 0:
+                    state = a - 1
+                    states.append(state)
+                    symbols.append(token)
+                    break
+                # Reduktion: Nehme <length> Symbole vom Stack.
+                elif a < 0:
+                    r = -a - 1
+                    n = rule_length[r]
+                    reduce = reducers[r]
+                    if reduce is None:
+                        states.pop()
+                    elif n:
+                        node = reduce(symbols[-n:])
+                        del symbols[-n:], states[-n:]
+                        symbols.append(node)
+                    else:
+                        symbols.append(reduce([]))
+                    state = goto[states[-1] * height + rule_left[r]]
+                    states.append(state)
+                else:
+                    raise ParseError(i, state, token)
+        return symbols[0]
+
+    # Wie parse(), aber mit den Schritten von push_parser, die die Shifts und
+    # Reduktionen in stats zählen. Die Zeit, die dabei für das Lesen der Token
+    # vergeht (z.B. in lexer.tokens mit stats), zählt nicht als Parserzeit.
+    def parse_counted(self, string, actions, stats):
+        clock = time.perf_counter
+        start, lexer_time = clock(), stats.lexer_time
+        parser = push_parser(self, actions, stats)
+        unknown = self.width - 1
+        for i, token in enumerate(itertools.chain(string, (End(),))):
+            if not parser.step(token, self.ids.get(type(token), unknown)):
+                raise ParseError(i, parser.error_state, token)
+        stats.sentences += 1
+        stats.parser_time += clock() - start - (stats.lexer_time - lexer_time)
+        return parser.symbols[0]
+
+    # Ein Parser im Push-Betrieb für eine Folge von Wörtern, siehe push_parser.
+    def push(self, actions=False, stats=None):
+        return push_parser(self, actions, stats)
+
+    # Lese die Wörter einer (auch unbeschränkten) Folge von Token, und liefere
+    # jedes, sobald es vollständig ist.
+    def stream(self, tokens, actions=False, stats=None):
+        parser = push_parser(self, actions, stats)
+        if stats is not None:
+            yield from self.stream_counted(parser, tokens, stats)
+            return
+        for token in tokens:
+            result = parser.feed(token)
+            if result is not None:
+                yield result
+        result = parser.finish()
+        if result is not None:
+            yield result
+
+    # Wie stream(), aber mit Messung der Zeit in feed() und finish().
+    def stream_counted(self, parser, tokens, stats):
+        clock = time.perf_counter
+        for token in tokens:
+            start = clock()
+            result = parser.feed(token)
+            stats.parser_time += clock() - start
+            if result is not None:
+                yield result
+        start = clock()
+        result = parser.finish()
+        stats.parser_time += clock() - start
+        if result is not None:
+            yield result
+
+    # Wie parse(), aber mit den dicts und Ausgabe jedes Schritts.
+    def parse_verbose(self, string):
         # Füge das Endsymbol an.
-        string = string + [End()]
+        string = list(string) + [End()]
 
         # Zustand-Stack, Symbol-Stack
         states = [self.start]
@@ -61,14 +233,94 @@ class lr1:
             # Fail:
             else:
                 raise ParseError(i, states[-1], string[i])
-            if verbose:
-                print('Stack: [{0}]'.format(', '.join(x.__class__.__name__ for x in symbols)))
-                print("State: ", states)
-                print('Tokens: [{0}]'.format(', '.join(x.__class__.__name__ for x in string[i:])))
-                print('+++')
+            print('Stack: [{0}]'.format(', '.join(x.__class__.__name__ for x in symbols)))
+            print("State: ", states)
+            print('Tokens: [{0}]'.format(', '.join(x.__class__.__name__ for x in string[i:])))
+            print('+++')
         return symbols[0]
 
 
+    # Erzeuge den Quelltext eines eigenständigen Python-Moduls, dessen
+    # Funktion parse(string) dieselben Bäume liefert wie self.parse(string).
+    # Statt der Tabellen enthält es pro Zustand ein dict von den Terminalen auf
+    # die Aktionen, und pro Regel eine Funktion, die die Symbole vom Stack
+    # nimmt, den Knoten erzeugt und den Folgezustand zurückgibt.
+    # Alle Symbolklassen müssen aus ihrem Modul importierbar sein.
+    #
+    # Die Schleife selbst ist nicht pro Zustand ausgerollt, sondern liest die
+    # Aktionen aus diesen dicts. Das Modul braucht den Generator nicht, ist
+    # aber nicht schneller geladen: Für die FO-Grammatik dauert der Import
+    # länger als das Erzeugen der Tabellen. Ob es schneller parst als
+    # self.parse, hängt von der Eingabe ab (siehe bench/codegen.py).
+    def generate(self):
+        classes = set(self.ids) | set(self.nonterm_ids)
+        for c in classes:
+            if importable(c) is not c:
+                raise ValueError('Symbol {0} kann nicht importiert werden.'.format(c.__qualname__))
+        name = lambda c: '{0}.{1}'.format(c.__module__, c.__qualname__)
+        height = len(self.nonterm_ids)
+        modules = sorted({c.__module__ for c in classes} | {__name__})
+
+        lines = ['# Erzeugt von parser.pda.lr1.generate(); nicht von Hand ändern.', '']
+        lines += ['import {0}'.format(m) for m in modules]
+        lines += ['', 'End = {0}'.format(name(End)), 'ParseError = {0}.ParseError'.format(__name__), '']
+
+        # Die Folgezustände pro Nichtterminal.
+        for left, i in sorted(self.nonterm_ids.items(), key=lambda x: x[1]):
+            targets = {state: self.goto[state * height + i] for state in self.states if (state, left) in self.shift}
+            lines.append('_goto{0} = {1!r}'.format(i, targets))
+        lines.append('')
+
+        for r, (left, right) in enumerate(self.rules):
+            n, goto = len(right), '_goto{0}'.format(self.rule_left[r])
+            lines.append('def _reduce{0}(symbols, states):'.format(r))
+            if n == 0:
+                lines.append('    symbols.append({0}([]))'.format(name(left)))
+            elif n == 1:
+                lines.append('    symbols[-1] = {0}(symbols[-1:])'.format(name(left)))
+                lines.append('    states.pop()')
+            else:
+                lines.append('    node = {0}(symbols[-{1}:])'.format(name(left), n))
+                lines.append('    del symbols[-{0}:], states[-{0}:]'.format(n))
+                lines.append('    symbols.append(node)')
+            lines.append('    return {0}[states[-1]]'.format(goto))
+            lines.append('')
+
+        # Pro Zustand ein dict: Shift nach s als s, Reduktion nach Regel r als -(r + 1).
+        numbering = {rule: r for (r, rule) in enumerate(self.rules)}
+        actions = [{} for state in self.states]
+        for (state, symbol), next in self.shift.items():
+            if symbol not in self.nonterm_ids:
+                actions[state][symbol] = str(next)
+        for (state, symbol), rule in self.reduce.items():
+            actions[state][symbol] = str(-numbering[rule] - 1)
+        lines.append('ACTION = (')
+        for action in actions:
+            lines.append('    {{{0}}},'.format(', '.join('{0}: {1}'.format(name(t), a) for (t, a) in sorted(action.items(), key=lambda x: name(x[0])))))
+        lines.append(')')
+        lines.append('REDUCE = ({0},)'.format(', '.join('_reduce{0}'.format(r) for r in range(len(self.rules)))))
+
+        lines.append('''
+def parse(string, ACTION=ACTION, REDUCE=REDUCE):
+    states = [0]
+    symbols = []
+    state = 0
+    for i, token in enumerate(list(string) + [End()]):
+        symbol = token.__class__
+        a = ACTION[state].get(symbol)
+        while a is not None and a < 0:
+            state = REDUCE[-a - 1](symbols, states)
+            states.append(state)
+            a = ACTION[state].get(symbol)
+        if a is None:
+            raise ParseError(i, state, token)
+        state = a
+        states.append(state)
+        symbols.append(token)
+    return symbols[0]
+''')
+        return '\n'.join(lines)
+
     def __str__(self):
         namesort = lambda x:x.__name__
         table = []
@@ -98,6 +350,196 @@ class lr1:
             '\n'.join('{0}: {1}'.format(i, rule_string(rule)) for (i, rule) in enumerate(rules))
         )
 
+# Ein Parser im Push-Betrieb: Er erhält die Token einzeln mit feed() und
+# behält seine Stacks zwischen den Aufrufen.
+#
+# Die Eingabe ist eine Folge von Wörtern der Grammatik ohne Trennzeichen. Ein
+# Wort ist vollständig, sobald das nächste Token es nicht mehr fortsetzen
+# kann; es wird dann mit End abgeschlossen und von feed() zurückgegeben (sonst
+# None), und das Token beginnt das nächste Wort. finish() schließt das letzte
+# Wort ab und gibt es zurück, oder None, wenn keines angefangen ist. Da die
+# Stacks danach von vorn beginnen, hängt der Speicherbedarf nur von der Länge
+# eines einzelnen Wortes ab.
+#
+# Die Position in einem ParseError zählt die Token der ganzen Folge. Mit
+# actions=True werden wie bei lr1.parse die semantischen Aktionen ausgeführt,
+# und mit stats die Schritte gezählt.
+class push_parser:
+    def __init__(self, automaton, actions=False, stats=None):
+        self.automaton = automaton
+        self.reducers = automaton.actions if actions else automaton.nodes
+        self.stats = stats
+        if stats is not None:
+            self.shifts, self.reductions = stats.counters(automaton)
+            self.step = self.step_counted
+        self.i = 0
+        self.error_state = None
+        self.reset()
+
+    def reset(self):
+        self.states = [self.automaton.start]
+        self.symbols = []
+
+    def feed(self, token):
+        a = self.automaton
+        symbol = a.ids.get(type(token), a.width - 1)
+        i = self.i
+        self.i += 1
+        state = self.states[-1]
+        if self.step(token, symbol):
+            return None
+        # Das Token setzt das Wort nicht fort: Schließe es ab.
+        if not self.symbols or not self.step(End(), a.ids[End]):
+            raise ParseError(i, state, token)
+        result = self.symbols[0]
+        self.complete()
+        if not self.step(token, symbol):
+            raise ParseError(i, self.error_state, token)
+        return result
+
+    def finish(self):
+        if not self.symbols:
+            return None
+        state = self.states[-1]
+        if not self.step(End(), self.automaton.ids[End]):
+            raise ParseError(self.i, state, End())
+        result = self.symbols[0]
+        self.complete()
+        return result
+
+    # Führe die Reduktionen vor dem Token aus und schiebe es dann; gibt False
+    # zurück, wenn das nicht möglich ist, und lässt die Stacks dann unverändert.
+    #
+    # Bei SLR- und LALR-Tabellen kann ein Terminal eine Reduktion auslösen,
+    # obwohl es danach nicht geschoben werden kann (es liegt nur in der
+    # globalen FOLLOW-Menge). feed() muss das Wort dann auf den unveränderten
+    # Stacks mit End abschließen können; deshalb prüft blocked() zuerst, ob
+    # die Reduktionen zu einem Shift führen.
+    def step(self, token, symbol):
+        state = self.blocked(symbol)
+        if state is not None:
+            self.error_state = state
+            return False
+        a = self.automaton
+        action, goto, width = a.action, a.goto, a.width
+        height = len(a.nonterm_ids)
+        states, symbols = self.states, self.symbols
+        state = states[-1]
+        while True:
+            x = action[state * width + symbol]
+            if x > 0:
+                states.append(x - 1)
+                symbols.append(token)
+                return True
+            elif x < 0:
+                r = -x - 1
+                n = a.rule_length[r]
+                reduce = self.reducers[r]
+                if reduce is None:
+                    states.pop()
+                elif n:
+                    node = reduce(symbols[-n:])
+                    del symbols[-n:], states[-n:]
+                    symbols.append(node)
+                else:
+                    symbols.append(reduce([]))
+                state = goto[states[-1] * height + a.rule_left[r]]
+                states.append(state)
+            else:
+                return False
+
+    # Führe die Reduktionen vor dem Terminal nur auf den Zuständen aus: Die
+    # unteren bleiben auf dem Stack (bis top), die neuen kommen nach pushed.
+    # Gibt None zurück, wenn sie zu einem Shift führen, und sonst den Zustand,
+    # in dem es keine Aktion gibt.
+    def blocked(self, symbol):
+        a = self.automaton
+        action, goto, width = a.action, a.goto, a.width
+        height = len(a.nonterm_ids)
+        states = self.states
+        top, pushed = len(states), []
+        state = states[-1]
+        while True:
+            x = action[state * width + symbol]
+            if x > 0:
+                return None
+            elif x < 0:
+                r = -x - 1
+                n = a.rule_length[r]
+                if n <= len(pushed):
+                    del pushed[len(pushed)-n:]
+                else:
+                    top -= n - len(pushed)
+                    pushed = []
+                state = goto[(pushed[-1] if pushed else states[top-1]) * height + a.rule_left[r]]
+                pushed.append(state)
+            else:
+                return state
+
+    # Ein Wort ist vollständig: Beginne von vorn.
+    def complete(self):
+        if self.stats is not None:
+            self.stats.sentences += 1
+        self.reset()
+
+    # Wie step(), aber zählt die Shifts und Reduktionen und die Tiefe des Stacks.
+    def step_counted(self, token, symbol):
+        state = self.blocked(symbol)
+        if state is not None:
+            self.error_state = state
+            return False
+        a = self.automaton
+        action, goto, width = a.action, a.goto, a.width
+        height = len(a.nonterm_ids)
+        states, symbols = self.states, self.symbols
+        stats = self.stats
+        state = states[-1]
+        while True:
+            x = action[state * width + symbol]
+            if x > 0:
+                states.append(x - 1)
+                symbols.append(token)
+                self.shifts[symbol] += 1
+                if len(states) > stats.max_depth:
+                    stats.max_depth = len(states)
+                return True
+            elif x < 0:
+                r = -x - 1
+                self.reductions[r] += 1
+                n = a.rule_length[r]
+                reduce = self.reducers[r]
+                if reduce is None:
+                    states.pop()
+                elif n:
+                    node = reduce(symbols[-n:])
+                    del symbols[-n:], states[-n:]
+                    symbols.append(node)
+                else:
+                    symbols.append(reduce([]))
+                state = goto[states[-1] * height + a.rule_left[r]]
+                states.append(state)
+                if len(states) > stats.max_depth:
+                    stats.max_depth = len(states)
+            else:
+                return False
+
+# Die Klasse unter Modul und Namen von c, oder None.
+def importable(c):
+    x = sys.modules.get(c.__module__)
+    if c.__module__ == '__main__':
+        return None
+    for part in c.__qualname__.split('.'):
+        x = getattr(x, part, None)
+    return x
+
+# Der kleinste Typcode des array-Moduls für Werte zwischen low und high.
+def typecode(low, high):
+    for code in 'bhil':
+        bits = array(code).itemsize * 8 - 1
+        if -2**bits <= low and high < 2**bits:
+            return code
+    return 'q'
+
 def state_string(state):
     return '{{\n{0}\n}}'.format('\n'.join(
         '  {0} →  {1} • {2}'.format(
@@ -0,0 +1,79 @@
+import time
+
+from .pda import rule_string
+
+# Messungen für lexer und lr1: Ein statistics-Objekt wird als stats an
+# lexer.tokens/lex und lr1.parse/push/stream übergeben und sammelt dort
+#
+# - die Anzahl der Token, und die Zeit des Lexers und des Parsers,
+# - pro Regel die Anzahl der Reduktionen, pro Terminal die der Shifts,
+# - die größte Tiefe des Stacks.
+#
+# Ohne stats laufen die gewöhnlichen Schleifen, die nichts davon zählen; die
+# Messungen kosten also nur etwas, wenn sie eingeschaltet sind. Mit stats
+# werden eigene Schleifen verwendet, die pro Token die Uhr lesen.
+class statistics:
+    def __init__(self):
+        self.tokens = 0
+        self.sentences = 0
+        self.max_depth = 0
+        self.lexer_time = 0.0
+        self.parser_time = 0.0
+        # Pro Automat eine Liste der Shifts pro Terminal-Id und eine der
+        # Reduktionen pro Regel (siehe lr1.build_arrays).
+        self.counts = {}
+
+    def counters(self, automaton):
+        if automaton not in self.counts:
+            self.counts[automaton] = ([0] * automaton.width, [0] * len(automaton.rules))
+        return self.counts[automaton]
+
+    # Liefere die Token des Lexers und zähle die Zeit, die er dafür braucht.
+    def lexed(self, pairs):
+        clock = time.perf_counter
+        pairs = iter(pairs)
+        while True:
+            start = clock()
+            try:
+                cls, value = next(pairs)
+            except StopIteration:
+                self.lexer_time += clock() - start
+                return
+            token = cls(value)
+            self.lexer_time += clock() - start
+            self.tokens += 1
+            yield token
+
+    def reductions(self):
+        result = {}
+        for automaton, (shifts, reductions) in self.counts.items():
+            for rule, n in zip(automaton.rules, reductions):
+                result[rule] = result.get(rule, 0) + n
+        return result
+
+    def shifts(self):
+        result = {}
+        for automaton, (shifts, reductions) in self.counts.items():
+            for symbol, i in automaton.ids.items():
+                result[symbol] = result.get(symbol, 0) + shifts[i]
+        return result
+
+    # Die Regeln, nach denen am häufigsten reduziert wurde, mit ihrer Anzahl.
+    def hot(self, top=10):
+        return sorted(((n, rule) for (rule, n) in self.reductions().items() if n),
+                      key=lambda x: -x[0])[:top]
+
+    def report(self, top=10):
+        reductions = sum(self.reductions().values())
+        shifts = sum(self.shifts().values())
+        total = self.lexer_time + self.parser_time
+        lines = [
+            'Tokens: {0}, sentences: {1}, shifts: {2}, reductions: {3}, maximum stack depth: {4}'.format(
+                self.tokens, self.sentences, shifts, reductions, self.max_depth),
+            'Lexer: {0:.4f}s, parser: {1:.4f}s, {2:.0f} tokens/s'.format(
+                self.lexer_time, self.parser_time, (self.tokens or shifts) / total if total else 0),
+            'Hot reductions:',
+        ]
+        for n, rule in self.hot(top):
+            lines.append('  {0:10} {1:6.1%}  {2}'.format(n, n / reductions, rule_string(rule)))
+        return '\n'.join(lines)
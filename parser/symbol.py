@@ -1,8 +1,19 @@
+# Die Symbole haben __slots__ statt eines __dict__ pro Objekt; davon
+# abgeleitete Klassen sollten ebenfalls __slots__ = () angeben.
 class Symbol:
+    __slots__ = ()
+
     def __str__(self):
         return self.__class__.__name__
 
 class NonTerm(Symbol):
+    # Eine semantische Aktion: Eine Funktion, die aus den Werten der rechten
+    # Seite direkt den Wert des Nichtterminals berechnet (siehe lr1.parse
+    # mit actions=True). Ohne Aktion wird bei einer Produktion der Länge 1 der
+    # Wert übernommen, und sonst ein Knoten der Klasse erzeugt.
+    action = None
+    __slots__ = ('production',)
+
     def __init__(self, production):
         self.production = production
     def graph(self, nodes=None, edges=None):
@@ -19,6 +30,8 @@ class NonTerm(Symbol):
         return nodes, edges
 
 class Term(Symbol):
+    __slots__ = ('value',)
+
     def __init__(self, value=None):
         self.value = value
 
@@ -26,8 +39,8 @@ class Term(Symbol):
         return self.__class__.__name__ + '(' + self.value + ')'
 
 class Start(NonTerm):
-    pass
+    __slots__ = ()
 
 class End(Term):
-    pass
+    __slots__ = ()
 
@@ -0,0 +1,164 @@
+import time
+
+import core as FO
+
+# Evaluate a formula while recording, for every subformula in it, how often it
+# is evaluated, how often it is true and false, how often it short-circuits,
+# and the time spent in it.
+#
+# Formula.evaluate() is left alone; this module has its own driver for the
+# steps() generators of core (see Node.evaluate), which notes the position of
+# each subformula as it is entered and left. Positions are counted as in the
+# printed formula, so the same subformula occurring twice is profiled twice.
+# Terms are evaluated directly and count towards the time of their atom.
+#
+# A connective short-circuits if it is decided by its first operand, and a
+# quantifier if it is decided before its domain is exhausted (∃ finds a
+# witness, or ∀ a counterexample, and elements of its domain are left over).
+# Quantifiers are therefore stepped through by quantifier() below instead of
+# their own steps(), which records the size of the domain as it is computed.
+#
+#     p = profile(formula, structure)
+#     p.value            # the truth value
+#     print(p.annotate()) # the formula, one subformula per line, with its counts
+#     p.collapsed()      # collapsed stacks for flamegraph tools
+
+terms = (FO.Variable, FO.Bound, FO.Constant, FO.Function)
+binary = (FO.And, FO.Or, FO.Implies, FO.Equivalent)
+
+class Site:
+    __slots__ = ('node', 'children', 'visits', 'true', 'false', 'short', 'time')
+
+    def __init__(self, node):
+        self.node = node
+        self.children = []
+        self.visits = self.true = self.false = self.short = 0
+        self.time = 0.0
+
+    # The time spent in this subformula itself, not in its subformulas.
+    def own_time(self):
+        return self.time - sum(c.time for c in self.children)
+
+    def label(self):
+        x = self.node
+        if x.__class__ in (FO.Exists, FO.Forall):
+            return '{0}{1}'.format('∃' if x.__class__ is FO.Exists else '∀', x.variable)
+        elif x.__class__ is FO.Negation:
+            return '¬'
+        elif x.__class__ in binary:
+            return {FO.And: '∧', FO.Or: '∨', FO.Implies: '→', FO.Equivalent: '↔'}[x.__class__]
+        return str(x)
+
+class Profile:
+    def __init__(self, formula):
+        self.root = Site(formula)
+        self.value = None
+        stack = [self.root]
+        while stack:
+            site = stack.pop()
+            site.children = [Site(c) for c in site.node.children() if c.__class__ not in terms]
+            stack.extend(site.children)
+
+    # The sites in pre-order, with their depth.
+    def sites(self):
+        stack = [(self.root, 0)]
+        while stack:
+            site, depth = stack.pop()
+            yield site, depth
+            stack.extend((c, depth + 1) for c in reversed(site.children))
+
+    def annotate(self):
+        total = self.root.time or 1
+        lines = ['{0:>10} {1:>10} {2:>10} {3:>10} {4:>10} {5:>6}  {6}'.format(
+            'visits', 'true', 'false', 'short', 'time', '%', 'formula')]
+        for site, depth in self.sites():
+            lines.append('{0:10} {1:10} {2:10} {3:10} {4:10.4f} {5:6.1%}  {6}{7}'.format(
+                site.visits, site.true, site.false, site.short, site.time, site.time / total,
+                '  ' * depth, site.label()))
+        return '\n'.join(lines)
+
+    # One line per subformula: the labels of the path to it, separated by
+    # semicolons, and its own time in microseconds.
+    def collapsed(self):
+        lines, stack = [], [(self.root, ())]
+        while stack:
+            site, path = stack.pop()
+            path += (site.label(),)
+            if site.visits:
+                lines.append('{0} {1}'.format(';'.join(path), max(0, round(site.own_time() * 1e6))))
+            stack.extend((c, path) for c in reversed(site.children))
+        return '\n'.join(lines)
+
+def profile(formula, structure, allocation=None):
+    if allocation is None:
+        allocation = FO.Allocation({})
+    result = Profile(formula)
+    clock = time.perf_counter
+
+    # Each frame holds the steps() generator of a subformula, its site, the
+    # number of operands it has asked for, the index of the last of them among
+    # the children of the site, its start time, and for a quantifier the size
+    # of its domain.
+    def enter(x, site):
+        frame = [None, site, 0, -1, None, None]
+        if x.__class__ in (FO.Exists, FO.Forall):
+            frame[0] = quantifier(x, structure, allocation, frame)
+        else:
+            frame[0] = x.steps(structure, allocation)
+        frame[4] = clock()
+        return frame
+
+    stack = [enter(formula, result.root)]
+    value = None
+    while stack:
+        frame = stack[-1]
+        try:
+            child = frame[0].send(value)
+        except StopIteration as stop:
+            value = stop.value
+            stack.pop()
+            steps, site, operands, last, start, size = frame
+            site.time += clock() - start
+            site.visits += 1
+            if value:
+                site.true += 1
+            else:
+                site.false += 1
+            if site.node.__class__ in binary:
+                site.short += operands < 2
+            elif site.node.__class__ in (FO.Exists, FO.Forall):
+                site.short += value == (site.node.__class__ is FO.Exists) and operands < size
+            continue
+        frame[2] += 1
+        if child.__class__ in terms:
+            value = child._evaluate(structure, allocation)
+            continue
+        # The operand is the next child of the site that is this node, or
+        # the first one again (for the body of a quantifier).
+        children = frame[1].children
+        matches = [i for i, c in enumerate(children) if c.node is child]
+        i = next((j for j in matches if j > frame[3]), matches[0])
+        frame[3] = i
+        stack.append(enter(child, children[i]))
+        value = None
+    result.value = value
+    return result
+
+# The steps of a quantifier, as in core, which also store the size of its
+# domain in the frame.
+def quantifier(x, structure, allocation, frame):
+    names, values = allocation.names, allocation.values
+    names.append(x.variable.name)
+    values.append(None)
+    try:
+        domain = x.domain(structure, allocation)
+        frame[5] = len(domain)
+        decisive = x.__class__ is FO.Exists
+        for element in domain:
+            values[-1] = element
+            if bool((yield x.formula)) == decisive:
+                return decisive
+        return not decisive
+    finally:
+        names.pop()
+        values.pop()
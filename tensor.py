@@ -0,0 +1,140 @@
+import core as FO
+
+# NumPy is an optional dependency; it is only required once a tensor
+# structure is actually constructed.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A tensor backend for evaluating formulas over finite structures.
+#
+# The universe is numbered 0..n-1 and each k-ary relation becomes a boolean
+# array of shape (n,)*k. Every subformula is evaluated to a pair (names, array),
+# where the axes of the array correspond to the free variables in names.
+# Junctors become elementwise operations (after broadcasting both sides to the
+# union of their variables), and quantifiers become any/all reductions along
+# the axis of the quantified variable.
+#
+# Terms are evaluated the same way to integer arrays of element numbers, so that
+# functions, constants and repeated variables are handled by fancy indexing.
+class TensorStructure:
+    def __init__(self, structure):
+        if numpy is None:
+            raise ImportError('The tensor backend requires numpy.')
+        self.structure = structure
+        self.universe = list(structure.universe)
+        self.numbering = {e: i for i, e in enumerate(self.universe)}
+        self.relations = {}
+        self.functions = {}
+
+    # Encode a relation as a boolean array. The arity is taken from the atom,
+    # since an empty relation does not reveal it.
+    def relation(self, symbol, arity):
+        if (symbol, arity) not in self.relations:
+            a = numpy.zeros((len(self.universe),) * arity, dtype=bool)
+            tuples = [t for t in self.structure.relations[symbol] if len(t) == arity]
+            if tuples:
+                a[tuple(numpy.array([[self.numbering[e] for e in t] for t in tuples]).T)] = True
+            self.relations[(symbol, arity)] = a
+        return self.relations[(symbol, arity)]
+
+    # Encode a function as an integer array holding the number of the image.
+    def function(self, symbol, arity):
+        if (symbol, arity) not in self.functions:
+            f = self.structure.functions[symbol]
+            a = numpy.empty((len(self.universe),) * arity, dtype=numpy.intp)
+            for index in numpy.ndindex(*a.shape):
+                a[index] = self.numbering[f.evaluate(tuple(self.universe[i] for i in index))]
+            self.functions[(symbol, arity)] = a
+        return self.functions[(symbol, arity)]
+
+    def evaluate(self, formula, allocation=None):
+        names, a = self.table(formula)
+        if allocation is None:
+            allocation = {}
+        elif isinstance(allocation, FO.Allocation):
+            allocation = allocation.a
+        return bool(a[tuple(self.numbering[allocation[name]] for name in names)])
+
+    # Evaluate a formula to a boolean tensor over its free variables, or a
+    # term to an integer tensor of element numbers.
+    #
+    # The subformulas and terms are evaluated bottom-up with an explicit
+    # stack, so that deep formulas do not exhaust the Python stack. The
+    # tensors of the children of each node are collected on out, and dropped
+    # once the node is combined from them.
+    def table(self, x):
+        out, stack = [], [(x, False)]
+        while stack:
+            node, done = stack.pop()
+            children = tuple(node.children())
+            if not done:
+                stack.append((node, True))
+                stack.extend((c, False) for c in reversed(children))
+                continue
+            values = out[len(out)-len(children):]
+            del out[len(out)-len(children):]
+            out.append(self.combine(node, values))
+        return out[0]
+
+    term = table
+
+    # The tensor of a node, given those of its children.
+    def combine(self, x, values):
+        if x.__class__ in (FO.Exists, FO.Forall):
+            names, a = values[1]
+            name = x.variable.name
+            if name not in names:
+                return names, a
+            axis = names.index(name)
+            reduce = numpy.any if x.__class__ is FO.Exists else numpy.all
+            return names[:axis] + names[axis+1:], reduce(a, axis=axis)
+        elif x.__class__ is FO.Negation:
+            names, a = values[0]
+            return names, ~a
+        elif x.__class__ in (FO.And, FO.Or, FO.Implies, FO.Equivalent):
+            names, (a1, a2) = align(values)
+            if x.__class__ is FO.And:
+                return names, a1 & a2
+            elif x.__class__ is FO.Or:
+                return names, a1 | a2
+            elif x.__class__ is FO.Implies:
+                return names, ~a1 | a2
+            else:
+                return names, a1 == a2
+        elif x.__class__ is FO.Equals:
+            names, (t1, t2) = align(values)
+            return names, t1 == t2
+        elif x.__class__ is FO.Relation:
+            r = self.relation(x.symbol, len(x.terms))
+            # Distinct variables only need a view of the relation itself.
+            names = tuple(t.name for t in x.terms if t.__class__ is FO.Variable)
+            if len(names) == len(x.terms) and len(set(names)) == len(names):
+                return names, r
+            names, terms = align(values)
+            return names, r[tuple(terms)]
+        elif x.__class__ is FO.Variable:
+            return (x.name,), numpy.arange(len(self.universe))
+        elif x.__class__ is FO.Constant:
+            return (), numpy.array(self.numbering[self.structure.constants[x.constant]])
+        elif x.__class__ is FO.Function:
+            f = self.function(x.symbol, len(x.terms))
+            names, terms = align(values)
+            return names, f[tuple(terms)]
+        raise ValueError("Cannot evaluate '%s'." % x)
+
+# Broadcast a list of tensors against each other. The variables are ordered by
+# first occurrence, and each array is transposed accordingly and given length-1
+# axes for the variables it does not depend on.
+def align(tensors):
+    names = []
+    for vs, a in tensors:
+        names.extend(v for v in vs if v not in names)
+    arrays = []
+    for vs, a in tensors:
+        order = sorted(range(len(vs)), key=lambda i: names.index(vs[i]))
+        a = numpy.asarray(a).transpose(order)
+        shape = iter(a.shape)
+        arrays.append(a.reshape([next(shape) if v in vs else 1 for v in names]))
+    return tuple(names), arrays
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+import batch
+import core as FO
+from bench import generate
+
+signature = {'E': ('relation', 2), 'P': ('relation', 1)}
+
+def test_check_agrees_with_evaluate():
+    rng = random.Random(0)
+    structures = [generate.structure(rng, signature, 4) for _ in range(20)]
+    formulas = [generate.formula(rng, signature, 6, 2) for _ in range(5)]
+    expected = [batch.evaluate(formulas, s) for s in structures]
+    assert list(batch.check(structures, formulas, workers=1)) == expected
+    assert list(batch.check(iter(structures), formulas, workers=2, chunksize=3, backlog=1)) == expected
+
+def test_check_rejects_empty_chunks():
+    for chunksize, backlog in ((0, 2), (-1, 2), (16, 0)):
+        with pytest.raises(ValueError):
+            batch.check([], [], chunksize=chunksize, backlog=backlog)
+
+def test_split_agrees_with_evaluate():
+    rng = random.Random(1)
+    x, y = FO.Variable('x'), FO.Variable('y')
+    formulas = [
+        FO.Forall(x, FO.Exists(y, FO.Relation('E', (x, y)))),
+        FO.Exists(x, FO.Exists(y, FO.And(FO.Relation('E', (x, y)), FO.Relation('P', (y,))))),
+        FO.Forall(x, FO.Forall(y, FO.Implies(FO.Relation('E', (x, y)), FO.Relation('E', (y, x))))),
+    ]
+    for _ in range(3):
+        structure = generate.structure(rng, signature, 12, 0.2)
+        for formula in formulas:
+            expected = formula.evaluate(structure, FO.Allocation({}))
+            for depth in (1, 2):
+                assert batch.split(formula, structure, workers=2, depth=depth, chunksize=5) == expected
+
+def test_split_rejects_empty_chunks():
+    formula = FO.Exists(FO.Variable('x'), FO.Relation('P', (FO.Variable('x'),)))
+    with pytest.raises(ValueError):
+        batch.split(formula, generate.structure(random.Random(0), signature, 3), chunksize=0)
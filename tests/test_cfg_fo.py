@@ -0,0 +1,37 @@
+import cfg_fo
+import core as FO
+import lexer_fo
+from cfg_fo import FoParser
+from parser import cfg
+
+class E(lexer_fo.Relation):
+    __slots__ = ()
+
+class C(lexer_fo.Constant):
+    __slots__ = ()
+
+signature = {'relations': {'E': (E, 2)}, 'functions': {}, 'constants': {'c': C}}
+
+def test_constant():
+    L, P = lexer_fo.lexer(signature), FoParser(signature, cache=False)
+    c = FO.Constant('c')
+    expected = FO.Exists(FO.Variable('x'), FO.And(FO.Equals(c, c), FO.Relation('E', (FO.Variable('x'), c))))
+    tokens = L.lex('∃x (c=c ∧ E(x,c))')
+    assert P.parse(tokens, actions=True) is expected
+    assert P.parse(tokens).fo() is expected
+    structure = FO.Structure([0, 1], {'E': {(1, 0)}}, {}, {'c': 0})
+    assert expected.evaluate(structure, FO.Allocation({}))
+
+# The tables are only cached on request, and the cache key changes with the
+# code that builds them.
+def test_cache_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setenv('PARSER_CACHE', str(tmp_path))
+    FoParser(signature)
+    assert list(tmp_path.iterdir()) == []
+    P = FoParser(signature, cache=True)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert FoParser(signature, cache=True).tables() == P.tables()
+    grammar = cfg.slr1_grammar(cfg_fo.prods(**signature), cfg_fo.Formula)
+    key = grammar.key('slr1')
+    monkeypatch.setattr(cfg, 'SOURCE_HASH', 'other')
+    assert grammar.key('slr1') != key
@@ -0,0 +1,142 @@
+import itertools
+import random
+
+import core as FO
+import converters
+from bench import clauses as bench_clauses, generate
+
+signature = {'E': ('relation', 2), 'P': ('relation', 1), 'f': ('function', 1), 'c': 'constant'}
+
+def atoms(x):
+    stack = [x]
+    while stack:
+        y = stack.pop()
+        yield y
+        stack.extend(y.children())
+
+# The symbols that to_clauses introduced, with their kind and arity.
+def new_symbols(table):
+    symbols = {}
+    for atom in table:
+        for y in atoms(atom):
+            if y.__class__ is FO.Relation and y.symbol not in signature:
+                symbols[y.symbol] = ('relation', len(y.terms))
+            elif y.__class__ is FO.Function and y.symbol not in signature:
+                symbols[y.symbol] = ('function', len(y.terms))
+            elif y.__class__ is FO.Constant and y.constant not in signature:
+                symbols[y.constant] = ('constant', 0)
+    return symbols
+
+# All interpretations of one symbol over the universe.
+def interpretations(kind, arity, universe):
+    tuples = generate.tuples(universe, arity)
+    if kind == 'constant':
+        return list(universe)
+    elif kind == 'relation':
+        return [{t for t, b in zip(tuples, bits) if b} for bits in itertools.product((0, 1), repeat=len(tuples))]
+    return [generate.Table(dict(zip(tuples, values))) for values in itertools.product(universe, repeat=len(tuples))]
+
+def holds(clauses, table, structure):
+    for clause in clauses:
+        names = sorted(frozenset().union(*(table[abs(i)-1].free_vars for i in clause)))
+        for values in itertools.product(structure.universe, repeat=len(names)):
+            allocation = dict(zip(names, values))
+            if not any(table[abs(i)-1].evaluate(structure, FO.Allocation(allocation)) == (i > 0) for i in clause):
+                return False
+    return True
+
+# Whether the structure can be expanded by the new symbols to satisfy the
+# clauses, by trying every expansion; None if there are too many.
+def satisfiable(clauses, table, structure, limit=4096):
+    symbols = sorted(new_symbols(table).items())
+    choices = [interpretations(kind, arity, structure.universe) for s, (kind, arity) in symbols]
+    if sum(len(c).bit_length() for c in choices) > limit.bit_length():
+        return None
+    for choice in itertools.product(*choices):
+        relations, functions, constants = dict(structure.relations), dict(structure.functions), dict(structure.constants)
+        for (s, (kind, arity)), value in zip(symbols, choice):
+            {'relation': relations, 'function': functions, 'constant': constants}[kind][s] = value
+        if holds(clauses, table, FO.Structure(structure.universe, relations, functions, constants)):
+            return True
+    return False
+
+# A formula holds in a structure if and only if its clauses can be satisfied
+# by interpreting the Skolem and definitional symbols over the same universe.
+def test_clauses_are_equisatisfiable_on_small_structures():
+    rng = random.Random(1)
+    checked = 0
+    while checked < 60:
+        structure = generate.structure(rng, signature, 2, 0.5)
+        formula = generate.formula(rng, signature, rng.randint(2, 5), 2, variables=2)
+        clauses, table = converters.to_clauses(formula)
+        result = satisfiable(clauses, table, structure)
+        if result is not None:
+            assert result == formula.evaluate(structure, FO.Allocation({})), formula
+            checked += 1
+
+def test_clause_encoding():
+    P, E = (lambda t: FO.Relation('P', (t,))), (lambda s, t: FO.Relation('E', (s, t)))
+    x, y = FO.Variable('x'), FO.Variable('y')
+    # ∀x (¬P(x) ∨ ∃y E(x, y)): one clause, with a unary Skolem function.
+    clauses, table = converters.to_clauses(FO.Forall(x, FO.Implies(P(x), FO.Exists(y, E(x, y)))))
+    assert clauses == [(-1, 2)]
+    assert table == [P(x), E(x, FO.Function('sk1', [x]))]
+    # A conjunction below a disjunction gets a definitional atom over the
+    # variables free in it; x1, which is bound inside it, is not among them.
+    formula = FO.Or(FO.Relation('Q', ()), FO.Forall(x, FO.And(P(x), FO.Exists(y, FO.And(E(x, y), FO.Forall(x, FO.Or(P(x), P(y))))))))
+    clauses, table = converters.to_clauses(formula)
+    assert clauses == [(1, 2), (-2, 3), (-2, 4), (-2, 5, 6)]
+    sk = FO.Function('sk1', [x])
+    assert table == [FO.Relation('Q', ()), FO.Relation('def1', [x]), P(x), E(x, sk), P(FO.Variable('x1')), P(sk)]
+
+# The clauses of n nested quantifiers grow linearly in n: 5n + 1 literals
+# and 4n arguments in the atoms.
+def test_clause_size_is_linear():
+    for n in (50, 100, 200):
+        assert bench_clauses.size(*converters.to_clauses(bench_clauses.formula(n))) == (5 * n + 1, 4 * n)
+
+P = lambda t: FO.Relation('P', (t,))
+E = lambda s, t: FO.Relation('E', (s, t))
+x, y, z, w = (FO.Variable(name) for name in 'xyzw')
+
+def prefix(formula):
+    quantifiers = []
+    while formula.__class__ in (FO.Exists, FO.Forall):
+        quantifiers.append(('∃' if formula.__class__ is FO.Exists else '∀') + formula.variable.name)
+        formula = formula.formula
+    return quantifiers, formula
+
+# Quantifiers in separate subformulas may be reordered, but each one stays
+# behind the quantifiers it was nested in.
+def test_prenex_order():
+    formula = FO.And(FO.And(FO.Forall(x, P(x)), FO.Exists(y, P(y))), FO.Forall(z, FO.Exists(w, E(z, w))))
+    matrix = FO.And(FO.And(P(x), P(y)), E(z, w))
+    assert prefix(converters.prenex(formula)) == (['∀x', '∃y', '∀z', '∃w'], matrix)
+    assert prefix(converters.prenex(formula, FO.Exists)) == (['∃y', '∀x', '∀z', '∃w'], matrix)
+    assert prefix(converters.prenex(formula, FO.Forall)) == (['∀x', '∀z', '∃y', '∃w'], matrix)
+
+# Quantifiers flip under negations and in the antecedents of implications.
+def test_prenex_flips_quantifiers():
+    formula = FO.Implies(FO.Forall(x, P(x)), FO.Negation(FO.Exists(y, P(y))))
+    assert prefix(converters.prenex(formula)) == (['∃x', '∀y'], FO.Implies(P(x), FO.Negation(P(y))))
+
+# Bound variables are renamed apart from each other and from free variables.
+def test_prenex_renames_variables():
+    formula = FO.And(FO.Forall(x, P(x)), FO.Exists(x, FO.Negation(P(x))))
+    assert prefix(converters.prenex(formula)) == (['∀x', '∃x1'], FO.And(P(x), FO.Negation(P(FO.Variable('x1')))))
+    formula = FO.And(P(x), FO.Exists(x, E(x, x)))
+    x1 = FO.Variable('x1')
+    assert prefix(converters.prenex(formula)) == (['∃x1'], FO.And(P(x), E(x1, x1)))
+
+def test_prenex_is_equivalent():
+    rng = random.Random(2)
+    for _ in range(200):
+        structure = generate.structure(rng, signature, 2)
+        formula = generate.formula(rng, signature, 6, 2)
+        expected = formula.evaluate(structure, FO.Allocation({}))
+        for first in (None, FO.Exists, FO.Forall):
+            result = converters.prenex(formula, first)
+            quantifiers, matrix = prefix(result)
+            assert len({q[1:] for q in quantifiers}) == len(quantifiers)
+            assert not any(q.__class__ in (FO.Exists, FO.Forall) for q in atoms(matrix))
+            assert result.evaluate(structure, FO.Allocation({})) == expected
@@ -0,0 +1,45 @@
+import random
+
+import core as FO
+from bench import generate
+from compiler import compile
+
+x, y = FO.Variable('x'), FO.Variable('y')
+
+signature = {'E': ('relation', 2), 'P': ('relation', 1), 'f': ('function', 1), 'c': 'constant'}
+
+# A guarded quantifier must not bind its variable to a value of a relation
+# tuple that is not in the universe.
+def test_guard_ignores_values_outside_universe():
+    formula = FO.Exists(x, FO.Exists(y, FO.Relation('E', (x, y))))
+    structure = FO.Structure([1, 2], {'E': {(1, 9)}}, {}, {})
+    assert not formula.evaluate(structure, FO.Allocation({}))
+    assert not compile(formula, {'E': ('relation', 2)})(structure)
+
+# Equality compares elements by identity, so the candidates of a guard must
+# be the universe objects, not equal objects from the relation tuples.
+def test_guard_yields_universe_objects():
+    element = int('1000')
+    structure = FO.Structure([element], {'E': {(int('1000'), int('1000'))}}, {}, {})
+    formula = FO.Exists(x, FO.Exists(y, FO.And(FO.Relation('E', (x, y)), FO.Equals(x, y))))
+    assert formula.evaluate(structure, FO.Allocation({}))
+    assert compile(formula, {'E': ('relation', 2)})(structure)
+
+# Guarded quantifiers give the same values as the compiled formulas, which
+# always enumerate the whole universe.
+def test_guards_agree_with_unindexed_evaluation():
+    rng = random.Random(0)
+    for _ in range(200):
+        structure = generate.structure(rng, signature, 5, rng.choice((0.1, 0.3, 0.6)))
+        formula = generate.formula(rng, signature, 8, 3)
+        expected = compile(formula, signature)(structure)
+        assert formula.evaluate(structure, FO.Allocation({})) == expected
+        assert FO.resolve(formula).evaluate(structure, FO.Allocation({})) == expected
+
+# Equal nodes are identical, but fields of different types are not merged.
+def test_interning_keeps_field_types_apart():
+    assert FO.Constant('a') is FO.Constant('a')
+    assert FO.Relation('E', [x, y]) is FO.Relation('E', (x, y))
+    nodes = [FO.Constant(1), FO.Constant(True), FO.Constant(1.0)]
+    assert len({id(c) for c in nodes}) == 3
+    assert [c.constant.__class__ for c in nodes] == [int, bool, float]
@@ -0,0 +1,41 @@
+import pickle
+
+import pytest
+
+import algebra
+import compiler
+import core as FO
+
+x = FO.Variable('x')
+structure = FO.Structure([0, 1], {'P': {(0,)}}, {}, {})
+
+# A formula far deeper than the Python stack allows for recursion.
+def deep(n=20000):
+    f = FO.Relation('P', (x,))
+    for i in range(n):
+        if i % 3 == 0:
+            f = FO.Exists(x, f)
+        elif i % 3 == 1:
+            f = FO.Negation(f)
+        else:
+            f = FO.And(f, FO.Relation('P', (x,)))
+    return f
+
+def test_pickle():
+    f = deep()
+    assert pickle.loads(pickle.dumps(f)) is f
+    assert pickle.loads(pickle.dumps(FO.resolve(f))) is FO.resolve(f)
+
+def test_algebra():
+    f = deep()
+    assert algebra.Query(f).run(structure) == ((), {()} if f.evaluate(structure, FO.Allocation({})) else set())
+
+def test_tensor():
+    tensor = pytest.importorskip('tensor')
+    pytest.importorskip('numpy')
+    f = deep()
+    assert tensor.TensorStructure(structure).evaluate(f) == f.evaluate(structure, FO.Allocation({}))
+
+def test_compile_rejects_deep_formulas():
+    with pytest.raises(ValueError):
+        compiler.compile(deep(), {'P': ('relation', 1)})
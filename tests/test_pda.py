@@ -0,0 +1,52 @@
+from parser import cfg, symbol
+from parser.pda import ParseError
+
+class S(symbol.NonTerm):
+    __slots__ = ()
+
+class A(symbol.NonTerm):
+    __slots__ = ()
+
+class a(symbol.Term):
+    __slots__ = ()
+
+class b(symbol.Term):
+    __slots__ = ()
+
+class c(symbol.Term):
+    __slots__ = ()
+
+class d(symbol.Term):
+    __slots__ = ()
+
+class e(symbol.Term):
+    __slots__ = ()
+
+# e is in FOLLOW(A), so the SLR(1) tables reduce a to A before e, although
+# after a sentence "a" the e can only begin the next sentence.
+prods = {S: {(a,), (A, b, c), (d, A, e), (e,)}, A: {(a,)}}
+
+def automata():
+    yield cfg.slr1_grammar(prods, S).slr1()
+    yield cfg.lalr1_grammar(prods, S).lalr1()
+    yield cfg.lr1_grammar(prods, S).lr1()
+
+def test_stream_closes_sentence_before_invalid_reduction():
+    for automaton in automata():
+        result = list(automaton.stream([a(), e()]))
+        assert [x.__class__ for x in result] == [S, S]
+        assert [x.production[0].__class__ for x in result] == [a, e]
+
+def test_failed_feed_leaves_stacks_unchanged():
+    for automaton in automata():
+        parser = automaton.push()
+        parser.feed(d())
+        parser.feed(a())
+        states, symbols = list(parser.states), list(parser.symbols)
+        try:
+            parser.feed(c())
+        except ParseError as error:
+            assert error.i == 2
+        else:
+            assert False, 'ParseError expected'
+        assert parser.states == states and parser.symbols == symbols
@@ -0,0 +1,14 @@
+import core as FO
+import profiler
+
+x, c = FO.Variable('x'), FO.Constant('c')
+
+# A witness or counterexample at the last element of the domain does not
+# short-circuit the quantifier; one at the first element does.
+def test_quantifier_short_circuits_only_with_elements_left():
+    for k, short in ((0, 1), (2, 0)):
+        structure = FO.Structure([0, 1, 2], {}, {}, {'c': k})
+        p = profiler.profile(FO.Exists(x, FO.Equals(x, c)), structure)
+        assert p.value and p.root.short == short
+        p = profiler.profile(FO.Forall(x, FO.Negation(FO.Equals(x, c))), structure)
+        assert not p.value and p.root.short == short
@@ -0,0 +1,40 @@
+# Traversals of formula trees with an explicit work stack instead of
+# recursion, so that they neither exhaust the Python stack on deep formulas
+# nor pay for a Python frame per node.
+#
+# A node is anything with a children() method; the formulas and terms of
+# core are such nodes. Since those are hash-consed, a formula is really a
+# DAG, and every distinct subformula is visited only once.
+
+# Post-order fold: leave(node, values) is called for each node with the list
+# of values already computed for its children, and returns the node's value.
+#
+# If descend is given, nodes for which descend(node) is false are not entered;
+# leave(node, None) is called for them instead.
+def fold(x, leave, descend=None):
+    results = {}
+    stack = [(x, None)]
+    while stack:
+        node, children = stack.pop()
+        if children is not None:
+            results[node] = leave(node, [results[c] for c in children])
+        elif node in results:
+            continue
+        elif descend is not None and not descend(node):
+            results[node] = leave(node, None)
+        else:
+            children = tuple(node.children())
+            stack.append((node, children))
+            stack.extend((c, None) for c in reversed(children) if c not in results)
+    return results[x]
+
+# Bottom-up rebuild: each node is rebuilt from its rewritten children, and then
+# passed through f, which returns its replacement (or the node itself).
+#
+# Nodes for which descend(node) is false are kept as they are.
+def rewrite(x, f, descend=None):
+    def leave(node, children):
+        if children is None:
+            return node
+        return f(node.rebuild(children))
+    return fold(x, leave, descend)